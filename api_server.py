@@ -0,0 +1,295 @@
+"""本地分析服务：基于asyncio的轻量HTTP接口，上传文件后排队分析，分析在有上限的进程池中执行
+
+用法：python api_server.py --port 8000 --workers 2 --queue-size 16
+
+接口：
+    POST /jobs?name=文件名.xlsx   请求体为文件内容，返回任务ID（内容的SHA-256）；相同内容只分析一次
+    GET  /jobs/<id>               任务状态：queued、running、done 或 failed
+    GET  /jobs/<id>/tables        各项分析结果（JSON）
+    GET  /jobs/<id>/report        Excel报告
+    GET  /jobs/<id>/charts/<name> 图表PNG，name 见 lamp_charts.CHART_FILES
+    GET  /health                  队列与任务概况
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+# 单次上传的大小上限
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+
+# 最多保留的任务数，超出时淘汰最早完成的任务
+MAX_JOBS = 64
+
+REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def content_digest(content):
+    """任务ID：上传内容的SHA-256"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def analyze_content(content, name):
+    """在工作进程中分析上传内容，全程不写文件，返回报告、图表和结构化结果"""
+    from lamp_analysis import run_pipeline, tables_to_json
+
+    source = io.BytesIO(content)
+    # 按文件名区分CSV和Excel
+    source.name = name
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        # 服务已在进程池中并行处理任务，图表在本进程内串行渲染
+        analyzer = run_pipeline(source, output_dir=None, parallel_charts=False)
+        # 结构化结果与Excel报告使用同一份报告数据，不重复计算
+        tables = tables_to_json(analyzer.report_tables)
+    return {
+        'rows': analyzer.rows,
+        'report': analyzer.report_bytes,
+        'charts': analyzer.chart_bytes,
+        'tables': tables,
+    }
+
+
+class Job:
+    """一次分析任务，以上传内容的哈希为ID"""
+
+    def __init__(self, job_id, name, content):
+        self.id = job_id
+        self.name = name
+        self.content = content
+        self.status = 'queued'
+        self.error = None
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'error': self.error,
+            'rows': None if self.result is None else self.result['rows'],
+            'charts': [] if self.result is None else sorted(self.result['charts']),
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class AnalysisService:
+    """任务队列与进程池：队列长度和并发数都有上限，队列已满时拒绝新任务"""
+
+    def __init__(self, workers=2, queue_size=16, max_jobs=MAX_JOBS):
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        # 工作进程用spawn启动：fork会复制哈希计算所用的线程池状态和已打开的客户端连接
+        self.executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.executor.shutdown(cancel_futures=True)
+
+    async def submit(self, name, content):
+        """提交任务，返回 (任务, 是否为新任务)；相同内容的未失败任务直接复用，队列已满时抛出 asyncio.QueueFull
+
+        大文件的哈希计算在默认线程池中进行，不阻塞事件循环。
+        """
+        loop = asyncio.get_running_loop()
+        job_id = await loop.run_in_executor(None, content_digest, content)
+        job = self.jobs.get(job_id)
+        if job is not None and job.status != 'failed':
+            return job, False
+        job = Job(job_id, name, content)
+        self.queue.put_nowait(job)
+        self.jobs[job_id] = job
+        self.jobs.move_to_end(job_id)
+        self._evict()
+        return job, True
+
+    def _evict(self):
+        """任务过多时淘汰最早提交且已结束的任务"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ('done', 'failed')]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            job.status, job.started = 'running', time.time()
+            try:
+                job.result = await loop.run_in_executor(
+                    self.executor, analyze_content, job.content, job.name)
+                job.status = 'done'
+            except Exception as e:
+                job.status, job.error = 'failed', str(e)
+            finally:
+                # 分析结束后不再需要上传内容
+                job.content = None
+                job.finished = time.time()
+                self.queue.task_done()
+
+    def health(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {'workers': self.workers, 'queued': self.queue.qsize(),
+                'queue_size': self.queue.maxsize, 'jobs': counts}
+
+
+def _response(writer, status, body=b'', content_type='application/json; charset=utf-8'):
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    elif isinstance(body, str):
+        body = body.encode('utf-8')
+    head = (f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Connection: close\r\n\r\n')
+    writer.write(head.encode('latin-1') + body)
+
+
+def _error(writer, status, message):
+    _response(writer, status, {'error': message})
+
+
+async def _read_request(reader):
+    """读取请求行和请求头，返回 (方法, 路径, 查询参数, 请求头)；请求体由调用方按需读取"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    method, target, _ = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+    url = urlsplit(target)
+    return method.upper(), url.path, parse_qs(url.query), headers
+
+
+def make_handler(service):
+    async def handle(reader, writer):
+        try:
+            try:
+                method, path, query, headers = await _read_request(reader)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                _error(writer, 400, "无法解析请求")
+                return
+            await _route(service, reader, writer, method, path, query, headers)
+        except Exception as e:
+            _error(writer, 500, str(e))
+        finally:
+            with contextlib.suppress(ConnectionError):
+                await writer.drain()
+            writer.close()
+    return handle
+
+
+async def _route(service, reader, writer, method, path, query, headers):
+    parts = [part for part in path.split('/') if part]
+    if parts == ['health']:
+        _response(writer, 200, service.health())
+        return
+
+    if parts == ['jobs']:
+        if method != 'POST':
+            _error(writer, 405, "只支持POST")
+            return
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            _error(writer, 400, "Content-Length 无效")
+            return
+        if length <= 0:
+            _error(writer, 400, "请求体为空，请上传文件内容")
+            return
+        if length > MAX_UPLOAD_BYTES:
+            _error(writer, 413, f"文件超过 {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+            return
+        content = await reader.readexactly(length)
+        name = query.get('name', ['upload.xlsx'])[0]
+        try:
+            job, created = await service.submit(name, content)
+        except asyncio.QueueFull:
+            _error(writer, 503, "任务队列已满，请稍后重试")
+            return
+        _response(writer, 202 if created else 200, job.to_dict())
+        return
+
+    if len(parts) < 2 or parts[0] != 'jobs':
+        _error(writer, 404, "接口不存在")
+        return
+    job = service.jobs.get(parts[1])
+    if job is None:
+        _error(writer, 404, "任务不存在")
+        return
+    if len(parts) == 2:
+        _response(writer, 200, job.to_dict())
+        return
+    if job.status != 'done':
+        _error(writer, 409, f"任务尚未完成：{job.status}")
+        return
+
+    result = job.result
+    if parts[2:] == ['tables']:
+        _response(writer, 200, result['tables'])
+    elif parts[2:] == ['report']:
+        _response(writer, 200, result['report'], XLSX_MIME)
+    elif len(parts) == 4 and parts[2] == 'charts' and parts[3] in result['charts']:
+        _response(writer, 200, result['charts'][parts[3]], 'image/png')
+    else:
+        _error(writer, 404, "结果不存在")
+
+
+async def serve(host='127.0.0.1', port=8000, workers=2, queue_size=16):
+    service = AnalysisService(workers=workers, queue_size=queue_size)
+    service.start()
+    server = await asyncio.start_server(make_handler(service), host, port)
+    print(f"分析服务已启动：http://{host}:{port}（{workers} 个工作进程，队列上限 {queue_size}）")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="台灯销售数据分析服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=2, help="同时执行分析的进程数")
+    parser.add_argument('--queue-size', type=int, default=16, help="排队任务数上限，超出时返回503")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue_size))
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,16 @@
+"""文件写入工具：缓存、增量存储和图表缓存共用的原子写入"""
+import os
+import threading
+from pathlib import Path
+
+
+def atomic_write_bytes(path, content):
+    """先写同目录下的临时文件再替换，并发读取方和写入中断都不会看到写了一半的文件"""
+    path = Path(path)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
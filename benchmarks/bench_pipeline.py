@@ -0,0 +1,183 @@
+"""分析流程基准测试：按多个规模生成合成数据，统计各阶段和完整 main() 的耗时，并与基线对比
+
+用法：python benchmarks/bench_pipeline.py --scales 10k 100k 1m [--save-baseline]
+规模可选 10k、100k、1m、10m；默认写CSV输入，--format xlsx 时规模不能超过xlsx单表行数上限。
+每次运行都与 --baseline 指定的基线文件对比，--save-baseline 将本次结果保存为新的基线。
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import lamp_analysis  # noqa: E402
+import lamp_charts  # noqa: E402
+from lamp_analysis import CACHE_DIR_NAME, StageProfiler, run_pipeline  # noqa: E402
+from synthetic import SCALES, generate_frame, write_dataset  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽分析过程中的控制台输出，避免打印耗时干扰计时"""
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def clear_caches(input_path, output_dir):
+    """清除解析缓存和图表缓存（进程内与输出目录下），保证每次计时都从头计算"""
+    shutil.rmtree(Path(input_path).parent / CACHE_DIR_NAME, ignore_errors=True)
+    shutil.rmtree(Path(output_dir) / CACHE_DIR_NAME, ignore_errors=True)
+    lamp_charts._memory_cache.clear()
+
+
+def time_stages(input_path, output_dir, args):
+    """运行一次 run_pipeline，返回 {阶段: (层级, 耗时秒数)}；每次运行前清除缓存"""
+    clear_caches(input_path, output_dir)
+    profiler = StageProfiler(trace_memory=args.memory)
+    with quiet():
+        run_pipeline(input_path, output_dir, streaming=args.streaming, charts=args.charts,
+                     use_cache=False, profiler=profiler)
+    return {record['stage']: (record['depth'], record['seconds']) for record in profiler.stages}
+
+
+def time_main(input_path, output_dir, args):
+    """运行一次完整的 main()，返回耗时秒数；每次运行前清除缓存"""
+    clear_caches(input_path, output_dir)
+    argv = ['--input', str(input_path), '--output-dir', str(output_dir)]
+    if args.streaming:
+        argv.append('--streaming')
+    if not args.charts:
+        argv.append('--no-charts')
+    start = time.perf_counter()
+    with quiet():
+        lamp_analysis.main(argv)
+    return time.perf_counter() - start
+
+
+def bench_scale(name, args, work_dir):
+    """生成一个规模的数据并计时，多轮运行时各项取最短耗时"""
+    rows = SCALES[name]
+    start = time.perf_counter()
+    frame = generate_frame(rows, seed=args.seed)
+    input_path = write_dataset(frame, work_dir / f'synthetic_{name}.{args.format}')
+    del frame
+    generate_seconds = time.perf_counter() - start
+
+    stages, main_seconds = {}, float('inf')
+    for _ in range(args.rounds):
+        for stage, (depth, seconds) in time_stages(input_path, work_dir / 'out', args).items():
+            best = stages.get(stage, (depth, float('inf')))[1]
+            stages[stage] = (depth, min(best, seconds))
+        main_seconds = min(main_seconds, time_main(input_path, work_dir / 'out', args))
+    return {
+        'rows': rows,
+        'generate_seconds': round(generate_seconds, 6),
+        'stages': {stage: {'depth': depth, 'seconds': round(seconds, 6)}
+                   for stage, (depth, seconds) in stages.items()},
+        'main_seconds': round(main_seconds, 6),
+    }
+
+
+def environment():
+    """记录运行环境，对比基线时据此判断结果是否可比"""
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def load_baseline(path):
+    """读取基线结果，不存在时返回None"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def _compare(seconds, baseline_seconds):
+    """格式化为“基线耗时 / 变化比例”，没有基线时为 -"""
+    if baseline_seconds is None:
+        return f"{'-':>10} {'-':>8}"
+    change = (seconds / baseline_seconds - 1) * 100 if baseline_seconds > 0 else 0.0
+    return f"{baseline_seconds:>10.3f} {change:>+7.1f}%"
+
+
+def print_results(results, baseline):
+    """打印各规模各阶段耗时，存在基线时同时显示基线耗时和变化比例"""
+    baseline_scales = (baseline or {}).get('scales', {})
+    for name, result in results.items():
+        base = baseline_scales.get(name, {})
+        base_stages = base.get('stages', {})
+        print(f"\n=== {name}（{result['rows']:,} 行，生成数据 {result['generate_seconds']:.2f} 秒）===")
+        print(f"{'阶段':<40} {'耗时(秒)':>10} {'基线(秒)':>10} {'变化':>8}")
+        for stage, record in result['stages'].items():
+            label = '  ' * record['depth'] + stage
+            base_seconds = base_stages.get(stage, {}).get('seconds')
+            print(f"{label:<40} {record['seconds']:>10.3f} {_compare(record['seconds'], base_seconds)}")
+        print(f"{'main()':<40} {result['main_seconds']:>10.3f} "
+              f"{_compare(result['main_seconds'], base.get('main_seconds'))}")
+        if result['rows'] and result['main_seconds'] > 0:
+            print(f"main() 吞吐量：{result['rows'] / result['main_seconds']:,.0f} 行/秒")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="台灯销售分析流程基准测试")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['10k', '100k', '1m'],
+                        help="数据规模，10m 需要数GB内存")
+    parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv', help="合成输入文件格式")
+    parser.add_argument('--rounds', type=int, default=1, help="每个规模运行的轮数，取最短耗时")
+    parser.add_argument('--seed', type=int, default=0, help="合成数据的随机种子")
+    parser.add_argument('--streaming', action='store_true', help="以流式模式运行分析")
+    parser.add_argument('--no-charts', dest='charts', action='store_false', help="不渲染图表")
+    parser.add_argument('--memory', action='store_true',
+                        help="同时统计各阶段峰值内存（tracemalloc 会拖慢计时）")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基线结果文件")
+    parser.add_argument('--save-baseline', action='store_true', help="将本次结果保存为基线")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='lamp_bench_') as work_dir:
+        for name in args.scales:
+            results[name] = bench_scale(name, args, Path(work_dir))
+
+    baseline = load_baseline(args.baseline)
+    if baseline is not None and baseline.get('environment') != environment():
+        print("注意：基线的运行环境与本次不同，对比结果仅供参考")
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        # 与已有基线合并，只覆盖本次运行的规模
+        saved = baseline or {'scales': {}}
+        saved['scales'].update(results)
+        saved.update({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'environment': environment(),
+            'options': {'format': args.format, 'rounds': args.rounds, 'seed': args.seed,
+                        'streaming': args.streaming, 'charts': args.charts},
+        })
+        Path(args.baseline).write_text(json.dumps(saved, ensure_ascii=False, indent=2),
+                                       encoding='utf-8')
+        print(f"\n基线已保存到 {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
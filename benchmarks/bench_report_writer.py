@@ -0,0 +1,76 @@
+"""对比旧版报告写法（拼接为单张稀疏表 + openpyxl）与分表流式写入的耗时和文件大小
+
+用法：python benchmarks/bench_report_writer.py [工作簿路径] --repeat 10 20 50
+--repeat 将原始数据复制多份，并给品牌、商品加上编号后缀，用来放大品牌和商品数量。
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lamp_analysis import LampAnalysis, find_excel_files, product_keys, write_excel_report  # noqa: E402
+
+
+def legacy_write(tables):
+    """旧版写法：所有结果加上分析类型列后拼接成一张表，用默认引擎写入"""
+    frames = []
+    for sheet_name, frame in tables.items():
+        frame = frame.copy()
+        frame['分析类型'] = sheet_name
+        frames.append(frame)
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        pd.concat(frames, ignore_index=True).to_excel(writer, sheet_name='销售分析报告', index=False)
+    return buffer.getvalue()
+
+
+def scaled_analyzer(file_path, repeat):
+    """读取工作簿并复制 repeat 份，返回已分箱的分析器"""
+    analyzer = LampAnalysis(file_path, output_dir=None)
+    base = analyzer.df
+    copies = []
+    for i in range(repeat):
+        copy = base.copy()
+        copy['品牌'] = copy['品牌'].astype(str) + f'#{i}'
+        copy['商品链接'] = copy['商品链接'].astype(str) + f'&copy={i}'
+        copies.append(copy)
+    analyzer.df = pd.concat(copies, ignore_index=True)
+    analyzer.df['品牌'] = analyzer.df['品牌'].astype('category')
+    analyzer.df['商品键'] = product_keys(analyzer.df)
+    analyzer.add_price_range()
+    return analyzer
+
+
+def timed(func, *args, rounds=3):
+    """返回多次运行中的最短耗时和最后一次的结果"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="报告写入性能对比")
+    parser.add_argument('file', nargs='?', help="工作簿路径，默认取 target 目录下第一个文件")
+    parser.add_argument('--repeat', type=int, nargs='+', default=[1, 10, 50])
+    args = parser.parse_args()
+
+    file_path = args.file or find_excel_files('target')[0]
+    print(f"{'行数':>10} {'写法':<8} {'耗时(秒)':>10} {'大小(KB)':>10}")
+    for repeat in args.repeat:
+        analyzer = scaled_analyzer(file_path, repeat)
+        tables = analyzer.build_report_tables()
+        for name, writer in (('旧版', legacy_write), ('分表流式', write_excel_report)):
+            elapsed, content = timed(writer, tables)
+            print(f"{len(analyzer.df):>10,} {name:<8} {elapsed:>10.3f} {len(content) / 1024:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
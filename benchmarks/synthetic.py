@@ -0,0 +1,83 @@
+"""生成与真实导出数据同结构的合成台灯销售数据，用于性能基准测试
+
+列与 target 目录下的导出文件一致：时间、商品标题、商品链接、销售额、销量、品牌、价格。
+品牌按Zipf分布抽样，少数头部品牌占据大部分行，与真实数据的品牌集中度相近；
+同一商品（商品链接）会在多个月份重复出现。
+"""
+import numpy as np
+import pandas as pd
+
+# 预设规模，键为命令行使用的名称
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# xlsx 单表行数上限（含表头），超过时只能生成CSV
+XLSX_MAX_ROWS = 1_048_575
+
+TITLE_TEMPLATES = [
+    '护眼台灯学习专用儿童书桌阅读灯',
+    '全光谱落地大路灯学生宿舍护眼灯',
+    '可夹式台灯写作业无影护眼长条灯',
+    '充电式折叠小台灯宿舍床头阅读灯',
+    '国AA级智能台灯卧室书桌LED灯',
+]
+
+LINK_PREFIX = 'https://item.taobao.com/item.htm?id='
+
+
+def brand_weights(n_brands, skew=1.1):
+    """Zipf分布的品牌权重：第 k 名品牌的权重与 1/k^skew 成正比"""
+    weights = 1.0 / np.arange(1, n_brands + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_frame(rows, n_brands=None, n_products=None, months=12, start='2024-03',
+                   skew=1.1, seed=0):
+    """生成 rows 行合成数据，全部列一次性向量化生成
+
+    n_brands 默认随规模增长（50~5000 个）；n_products 默认为行数的四分之一，
+    每个商品固定所属品牌、价格和标题，各行从商品池中抽取并分配到 months 个月份之一。
+    """
+    rng = np.random.default_rng(seed)
+    n_brands = n_brands or int(np.clip(rows // 200, 50, 5000))
+    n_products = n_products or max(1, rows // 4)
+
+    # 商品级属性：品牌、价格（对数正态，中位数约200元，覆盖全部默认价格区间）、标题、链接
+    product_brand = rng.choice(n_brands, size=n_products, p=brand_weights(n_brands, skew))
+    product_price = np.round(rng.lognormal(np.log(200), 0.9, size=n_products), 2)
+    product_template = rng.integers(len(TITLE_TEMPLATES), size=n_products)
+    product_id = 600_000_000_000 + rng.choice(100_000_000_000, size=n_products, replace=False)
+
+    brand_names = np.array([f'品牌{i:04d}' for i in range(n_brands)], dtype=object)
+    templates = np.array(TITLE_TEMPLATES, dtype=object)
+    id_text = product_id.astype(str).astype(object)
+    product_title = brand_names[product_brand] + templates[product_template] + id_text
+    product_link = LINK_PREFIX + id_text
+
+    # 行级数据：抽取商品与月份，销量为重尾分布，销售额 = 价格 × 销量
+    product = rng.integers(n_products, size=rows)
+    volume = np.ceil(rng.lognormal(3, 1.5, size=rows)).astype(np.int64)
+    price = product_price[product]
+    periods = pd.period_range(start, periods=months, freq='M').strftime('%Y-%m')
+    month = rng.integers(months, size=rows)
+
+    return pd.DataFrame({
+        '时间': pd.Categorical.from_codes(month, categories=periods),
+        '商品标题': product_title[product],
+        '商品链接': product_link[product],
+        '销售额': np.round(price * volume, 2),
+        '销量': volume,
+        '品牌': pd.Categorical.from_codes(product_brand[product], categories=brand_names),
+        '价格': price,
+    })
+
+
+def write_dataset(frame, path):
+    """按扩展名将合成数据写为CSV或xlsx；xlsx 超过单表行数上限时报错"""
+    path = str(path)
+    if path.lower().endswith('.csv'):
+        frame.to_csv(path, index=False)
+    elif len(frame) > XLSX_MAX_ROWS:
+        raise ValueError(f"xlsx 单表最多 {XLSX_MAX_ROWS:,} 行数据，{len(frame):,} 行请改用CSV")
+    else:
+        frame.to_excel(path, index=False, engine='xlsxwriter')
+    return path
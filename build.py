@@ -11,5 +11,7 @@ PyInstaller.__main__.run([
     '--windowed',  # 使用GUI模式
     '--onefile',  # 打包成单个文件
     f'--add-data={os.path.join(current_dir, "lamp_analysis.py")}:.',  # 添加依赖文件
+    f'--add-data={os.path.join(current_dir, "lamp_charts.py")}:.',
+    f'--add-data={os.path.join(current_dir, "atomic_io.py")}:.',
     '--clean',  # 清理临时文件
 ])
\ No newline at end of file
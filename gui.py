@@ -1,7 +1,18 @@
+import time
+
+# 用于启动耗时分析的起始时间，需在其他导入之前记录
+_START_TIME = time.perf_counter()
+
+import multiprocessing
+import queue
+import sys
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from pathlib import Path
-from lamp_analysis import LampAnalysis
+
+# 启动时不应加载的重量级模块，分析开始后才导入
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'openpyxl')
 
 class LampAnalysisGUI:
     def __init__(self, root):
@@ -29,9 +40,22 @@ class LampAnalysisGUI:
         self.select_button.pack(side='left', padx=5)
         
         # 分析按钮
-        self.analyze_button = tk.Button(self.main_frame, text="开始分析", command=self.run_analysis,
+        self.button_frame = tk.Frame(self.main_frame)
+        self.button_frame.pack(pady=20)
+        
+        self.analyze_button = tk.Button(self.button_frame, text="开始分析", command=self.run_analysis,
                                       width=20, height=2)
-        self.analyze_button.pack(pady=20)
+        self.analyze_button.pack(side='left', padx=5)
+        
+        self.cancel_button = tk.Button(self.button_frame, text="取消", command=self.cancel_analysis,
+                                     width=10, height=2, state='disabled')
+        self.cancel_button.pack(side='left', padx=5)
+        
+        # 后台分析线程通过队列把进度消息传回界面线程
+        self.messages = queue.Queue()
+        self.cancel_event = None
+        self.worker = None
+        self.stage_lines = {}
         
         # 状态显示
         self.status_var = tk.StringVar()
@@ -52,30 +76,100 @@ class LampAnalysisGUI:
         if not file_path:
             messagebox.showerror("错误", "请先选择Excel文件！")
             return
+        if self.worker is not None and self.worker.is_alive():
+            return
             
-        try:
-            self.status_var.set("正在分析数据...")
-            self.root.update()
+        self.stage_lines = {}
+        self.status_var.set("正在分析数据...")
+        self.analyze_button.config(state='disabled')
+        self.cancel_button.config(state='normal')
+        self.cancel_event = threading.Event()
+        self.worker = threading.Thread(target=self._analysis_worker,
+                                       args=(file_path, self.cancel_event), daemon=True)
+        self.worker.start()
+        self.root.after(100, self._poll_messages)
+        
+    def cancel_analysis(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_button.config(state='disabled')
+            self.stage_lines['取消'] = "正在取消，当前阶段结束后停止..."
+            self._show_stages()
             
-            # 运行分析
-            analyzer = LampAnalysis(file_path)
-            analyzer.add_price_range()
-            analyzer.analyze_total_sales()
-            analyzer.analyze_price_range_distribution()
-            analyzer.analyze_brand_market_share()
-            analyzer.analyze_top_brands_price_distribution()
-            analyzer.save_analysis_to_excel()
+    def _analysis_worker(self, file_path, cancel_event):
+        """在后台线程中运行分析，所有界面更新都通过消息队列交给主线程"""
+        try:
+            # 延迟导入分析模块，窗口启动时无需加载pandas等依赖
+            from lamp_analysis import AnalysisCancelled, run_pipeline
             
-            self.status_var.set("分析完成！\n报告已保存为：台灯销售分析报告.xlsx\n图表已保存在当前目录下。")
-            messagebox.showinfo("完成", "数据分析已完成！")
+            def progress(stage, status, elapsed):
+                self.messages.put(('progress', stage, status, elapsed))
             
+            run_pipeline(file_path, progress=progress, cancel_event=cancel_event)
+            self.messages.put(('done',))
+        except AnalysisCancelled as e:
+            self.messages.put(('cancelled', str(e)))
         except Exception as e:
-            self.status_var.set(f"分析过程中出现错误：{str(e)}")
-            messagebox.showerror("错误", f"分析失败：{str(e)}")
+            self.messages.put(('error', str(e)))
+            
+    def _poll_messages(self):
+        """在主线程中处理后台线程发来的消息"""
+        finished = False
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            kind = message[0]
+            if kind == 'progress':
+                _, stage, status, elapsed = message
+                if status == 'start':
+                    self.stage_lines[stage] = f"{stage}：进行中..."
+                elif status == 'done':
+                    self.stage_lines[stage] = f"{stage}：完成（{elapsed:.2f} 秒）"
+                else:
+                    self.stage_lines[stage] = f"{stage}：已跳过"
+                self._show_stages()
+            elif kind == 'done':
+                finished = True
+                self.status_var.set("分析完成！\n报告已保存为：台灯销售分析报告.xlsx\n图表已保存在当前目录下。\n\n"
+                                    + "\n".join(self.stage_lines.values()))
+                messagebox.showinfo("完成", "数据分析已完成！")
+            elif kind == 'cancelled':
+                finished = True
+                self.status_var.set(f"{message[1]}")
+            else:
+                finished = True
+                self.status_var.set(f"分析过程中出现错误：{message[1]}")
+                messagebox.showerror("错误", f"分析失败：{message[1]}")
+        
+        if finished:
+            self.analyze_button.config(state='normal')
+            self.cancel_button.config(state='disabled')
+        else:
+            self.root.after(100, self._poll_messages)
+            
+    def _show_stages(self):
+        self.status_var.set("正在分析数据...\n\n" + "\n".join(self.stage_lines.values()))
+
+def report_startup(root):
+    """打印窗口就绪耗时和已加载的重量级模块，然后退出"""
+    root.update_idletasks()
+    elapsed = time.perf_counter() - _START_TIME
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"窗口就绪耗时：{elapsed * 1000:.0f} ms")
+    print(f"已加载的重量级模块：{'、'.join(loaded) if loaded else '无'}")
+    root.destroy()
 
 def main():
+    # 打包后的程序在子进程中渲染图表，需要先处理多进程启动
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = LampAnalysisGUI(root)
+    # python gui.py --startup-profile 用于检查启动耗时，
+    # 配合 python -X importtime gui.py --startup-profile 可查看各模块导入耗时
+    if '--startup-profile' in sys.argv:
+        root.after_idle(report_startup, root)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -1,55 +1,1317 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import argparse
+import contextlib
+import glob
+import hashlib
+import io
+import json
 import os
+import pickle
+import sqlite3
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['Arial Unicode MS']
-plt.rcParams['axes.unicode_minus'] = False
+import lamp_charts
+from atomic_io import atomic_write_bytes
+
+# 解析后数据的缓存目录，位于源工作簿所在目录下
+CACHE_DIR_NAME = '.lamp_cache'
+
+# 分析报告文件名
+REPORT_FILE_NAME = '台灯销售分析报告.xlsx'
+
+# 多文件对比报告文件名
+COMPARE_REPORT_FILE_NAME = '对比分析报告.xlsx'
+
+# 结构化输出支持的格式
+OUTPUT_FORMATS = ('json', 'parquet', 'csv')
+
+# 各阶段耗时与内存画像的默认文件名
+PROFILE_FILE_NAME = 'profile.json'
+
+# 完整分析流程的各个阶段
+PIPELINE_STAGES = ('读取数据', '聚合计算', '生成图表', '导出Excel')
+
+# 趋势分析的周期粒度：按月或按周（每周从周一开始），周期以起始日期标记
+TREND_FREQS = {'month': 'MS', 'week': 'W-MON'}
+
+# 时间值为日期区间时允许的最大跨度（天），超过一个月的区间无法归入单一周期
+MAX_PERIOD_SPAN_DAYS = 31
+
+# 默认价格区间
+PRICE_RANGES = [0, 100, 200, 300, 400, 500, 800, 1000, float('inf')]
+PRICE_LABELS = ['0-100', '100-200', '200-300', '300-400',
+                '400-500', '500-800', '800-1000', '1000+']
+
+# 各项分析实际用到的列，读取时只加载这些列
+LOAD_COLUMNS = ['商品标题', '商品链接', '销售额', '销量', '品牌', '价格']
+# 存在时才读取的列；时间 用于趋势分析，缺少时只是没有趋势结果
+OPTIONAL_COLUMNS = ['时间']
+
+# 聚合立方体的分组维度与度量
+CUBE_KEYS = ['周期', '品牌', '价格区间']
+CUBE_VALUES = ['销售额', '销量']
+# 商品排行保留的列
+PRODUCT_COLUMNS = ['价格区间', '商品标题', '商品链接', '销售额', '销量']
+
+# 近似模式下未被草图跟踪的品牌在聚合立方体中合并为该名称
+OTHER_BRAND = '其他品牌'
+
+
+def find_excel_files(directory):
+    """列出目录下待分析的工作簿，跳过Office锁文件（~$开头）和隐藏文件"""
+    return sorted(
+        path for path in Path(directory).glob('*.xlsx')
+        if path.is_file() and not path.name.startswith(('~$', '.'))
+    )
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """计算文件内容的SHA-256摘要，用作缓存键"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _as_source(source):
+    """统一输入：路径转为Path，bytes包装为BytesIO，文件对象原样返回"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, (str, os.PathLike)):
+        return Path(source)
+    return source
+
+
+def _is_csv(source):
+    """按文件名判断是否为CSV输入；文件对象使用其 name 属性，内存数据默认按Excel处理"""
+    name = source if isinstance(source, Path) else getattr(source, 'name', '')
+    return str(name).lower().endswith('.csv')
+
+
+def _read_columns(source):
+    """只读取 LOAD_COLUMNS 中的列，缺少必要列时给出明确错误"""
+    usecols = lambda column: column in LOAD_COLUMNS or column in OPTIONAL_COLUMNS
+    if _is_csv(source):
+        df = pd.read_csv(source, usecols=usecols)
+    else:
+        df = pd.read_excel(source, usecols=usecols)
+    missing = [column for column in LOAD_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"数据文件缺少必要的列：{', '.join(missing)}")
+    return df
+
+
+def read_excel_cached(file_path, use_cache=True):
+    """读取Excel文件，按内容哈希将解析结果缓存为Parquet，工作簿内容变化时缓存自动失效
+
+    file_path 也可以是bytes或文件对象，此时直接解析，不使用磁盘缓存。
+    """
+    file_path = _as_source(file_path)
+    if not isinstance(file_path, Path) or _is_csv(file_path) or not use_cache:
+        return _read_columns(file_path)
+
+    # 缓存键同时包含文件内容和加载列，加载列调整后旧缓存不会被误用
+    schema_tag = hashlib.sha256(','.join(LOAD_COLUMNS + OPTIONAL_COLUMNS).encode()).hexdigest()[:8]
+    cache_dir = file_path.parent / CACHE_DIR_NAME
+    cache_path = cache_dir / f'{file_path.stem}.{file_digest(file_path)[:16]}-{schema_tag}.parquet'
+    if cache_path.exists():
+        try:
+            return pd.read_parquet(cache_path)
+        except Exception as e:
+            print(f"读取缓存失败，重新解析Excel：{e}")
+
+    df = _read_columns(file_path)
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        # 清理同一工作簿旧内容对应的缓存
+        for stale in cache_dir.glob(f'{glob.escape(file_path.stem)}.*.parquet'):
+            if stale.name.rsplit('.', 2)[0] == file_path.stem:
+                stale.unlink()
+        atomic_write_bytes(cache_path, df.to_parquet(index=False))
+    except Exception as e:
+        print(f"写入缓存失败，已跳过：{e}")
+    return df
+
+
+def _downcast_float(series):
+    """仅在不损失精度时将浮点列降为float32，避免价格落入不同的价格区间"""
+    downcast = pd.to_numeric(series, downcast='float')
+    if downcast.dtype == series.dtype:
+        return series
+    same = (downcast.astype(series.dtype) == series) | (series.isna() & downcast.isna())
+    return downcast if same.all() else series
+
+
+def parse_period(values):
+    """将时间列解析为周期起始日期
+
+    取每个值中第一个日期作为周期起点；值为日期区间（如“2024-03 至 2025-02”）且跨度超过一个月时
+    不属于任何单一周期，记为NaT，避免整个区间被当作起始月份而得到虚假的趋势。无法解析时同样为NaT。
+    只对去重后的取值解析一次，再映射回各行。
+    """
+    uniques = pd.Series(values.dropna().unique())
+    if uniques.empty:
+        return pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    dates = uniques.astype(str).str.findall(r'\d{4}[-/]\d{1,2}(?:[-/]\d{1,2})?')
+    first, last = dates.str[0], dates.str[-1]
+    start = pd.to_datetime(first.str.replace('/', '-'), errors='coerce', format='mixed')
+    end = pd.to_datetime(last.str.replace('/', '-'), errors='coerce', format='mixed')
+    # 只到月份的终点取该月最后一天
+    end = end.where(last.str.count('[-/]') == 2, end + pd.offsets.MonthEnd(0))
+    parsed = start.where(end - start <= pd.Timedelta(days=MAX_PERIOD_SPAN_DAYS))
+    return values.map(pd.Series(parsed.values, index=uniques.values)).astype('datetime64[ns]')
+
+
+def add_period_column(frame):
+    """根据时间列添加周期列，没有时间列时周期为NaT"""
+    if '时间' in frame.columns:
+        frame['周期'] = parse_period(frame['时间'])
+    else:
+        frame['周期'] = pd.Series(pd.NaT, index=frame.index, dtype='datetime64[ns]')
+    return frame
+
+
+def apply_schema(df):
+    """压缩数据类型：品牌转为分类，销量和价格按取值范围降位；销售额保留float64以保证求和精度"""
+    add_period_column(df)
+    if '时间' in df.columns:
+        # 时间只用于生成周期，解析后不再保留
+        df.drop(columns='时间', inplace=True)
+    df['品牌'] = df['品牌'].astype('category')
+    df['销量'] = pd.to_numeric(df['销量'], downcast='integer')
+    df['价格'] = _downcast_float(pd.to_numeric(df['价格'], errors='coerce'))
+    # 商品去重键在加载时计算一次，之后的商品汇总按整数键分组
+    df['商品键'] = product_keys(df)
+    return df
+
+
+def current_rss():
+    """返回当前进程的常驻内存（字节），平台不支持时返回None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # 非Linux平台退而使用峰值常驻内存；macOS单位为字节，其余为KB
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageProfiler:
+    """记录各阶段的耗时、峰值内存和处理行数
+
+    trace_memory 为真时用 tracemalloc 统计峰值内存，为阶段内相对阶段开始时新增的内存峰值；
+    阶段可以嵌套，外层阶段的峰值包含内层阶段。tracemalloc 会使耗时成倍增加，
+    因此默认只计时；由本画像开启的 tracemalloc 在最外层阶段结束时关闭。
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._stack = []
+        self._started_tracing = False
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        """统计 with 块内的耗时和内存，返回的记录可在块内补充 rows 等字段"""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        tracing = self.trace_memory
+        record = {'stage': name, 'depth': len(self._stack), 'rows': rows}
+        self.stages.append(record)
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                # 重置峰值前先把到目前为止的峰值记到外层阶段
+                parent = self._stack[-1]
+                parent['_peak'] = max(parent['_peak'], peak)
+            tracemalloc.reset_peak()
+            record['_base'], record['_peak'] = current, current
+        self._stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            self._stack.pop()
+            if tracing:
+                peak = max(record.pop('_peak'), tracemalloc.get_traced_memory()[1])
+                record['peak_memory_bytes'] = peak - record.pop('_base')
+                if self._stack:
+                    self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak)
+                elif self._started_tracing:
+                    # 不让追踪影响本阶段之外的耗时
+                    tracemalloc.stop()
+                    self._started_tracing = False
+            record['rss_bytes'] = current_rss()
+
+    def to_dict(self):
+        """返回可序列化为JSON的分析画像"""
+        return {
+            'total_seconds': round(time.perf_counter() - self._start, 6),
+            'trace_memory': self.trace_memory,
+            'stages': [dict(record) for record in self.stages],
+        }
+
+    def write_json(self, path):
+        """将分析画像写入JSON文件"""
+        Path(path).write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2),
+                              encoding='utf-8')
+
+    def print_summary(self):
+        """打印各阶段耗时、峰值内存和行数"""
+        mb = 1024 * 1024
+        print("\n=== 阶段耗时 ===")
+        print(f"{'阶段':<40} {'耗时(秒)':>10} {'峰值内存(MB)':>14} {'行数':>12}")
+        for record in self.stages:
+            name = '  ' * record['depth'] + record['stage']
+            peak = record.get('peak_memory_bytes')
+            peak = '-' if peak is None else f"{peak / mb:,.2f}"
+            rows = '-' if record['rows'] is None else f"{record['rows']:,}"
+            print(f"{name:<40} {record['seconds']:>10.3f} {peak:>14} {rows:>12}")
+
+
+def profiled(profiler, name, rows=None):
+    """profiler 为None时返回空上下文，便于在未开启画像时保持调用方式一致"""
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name, rows)
+
+
+def iter_chunks(file_path, chunksize=100000):
+    """按块读取Excel（openpyxl只读模式逐行迭代）或CSV文件，不一次性载入整张表"""
+    file_path = _as_source(file_path)
+    if _is_csv(file_path):
+        yield from pd.read_csv(file_path, chunksize=chunksize)
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(row)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def build_cube(frame):
+    """按(周期 × 品牌 × 价格区间)汇总销售额和销量；输入既可以是明细行，也可以是已展开的部分立方体"""
+    # dropna=False 保留品牌或价格区间缺失的行，使立方体合计与全表合计一致
+    return frame.groupby(CUBE_KEYS, observed=True, dropna=False)[CUBE_VALUES].sum()
+
+
+def summarize_cube(cube, top_products):
+    """由聚合立方体派生各项分析共用的汇总表"""
+    return {
+        'cube': cube,
+        'brand_range': cube.groupby(level=['品牌', '价格区间'], observed=True).sum(),
+        'total_sales': cube['销售额'].sum(),
+        'total_volume': cube['销量'].sum(),
+        'price_range': cube.groupby(level='价格区间', observed=True).sum(),
+        'brand': cube.groupby(level='品牌', observed=True).sum().sort_values('销售额', ascending=False),
+        'top_products': top_products,
+    }
+
+
+def grouped_top_n(frame, by, column, n=5):
+    """返回每个分组内 column 最大的前 n 行；组内使用部分选择，不对整表排序
+
+    frame 的索引需唯一，结果按分组出现顺序排列，组内按 column 降序。
+    """
+    top = frame.groupby(by, observed=True, sort=False)[column].nlargest(n)
+    if top.empty:
+        # 空结果的索引会带上分组列名，之后再按该列分组时会与同名列冲突
+        return frame.iloc[:0]
+    return frame.loc[top.index.get_level_values(-1)]
+
+
+def split_by_group(frame, by, labels):
+    """将分组TOP N结果拆分为 {标签: DataFrame}，缺少数据的标签对应空表"""
+    groups = dict(tuple(frame.groupby(by, observed=True, sort=False)))
+    return {label: groups.get(label, frame.iloc[:0]).drop(columns=by) for label in labels}
+
+
+def product_keys(frame):
+    """商品去重键：优先取商品链接，缺失时取规范化（去首尾空白、小写、合并空白）后的商品标题，哈希为64位整数"""
+    keys = frame['商品链接'].astype(object)
+    missing = keys.isna()
+    if missing.any():
+        titles = frame.loc[missing, '商品标题'].astype(str).str.strip().str.lower()
+        keys = keys.copy()
+        keys[missing] = '标题:' + titles.str.replace(r'\s+', ' ', regex=True)
+    return pd.Series(pd.util.hash_array(keys.to_numpy(dtype=object)), index=frame.index,
+                     name='商品键')
+
+
+def build_product_index(frame):
+    """按(价格区间, 商品键)汇总销售额和销量，同一商品的多行记录合并为一行
+
+    商品标题、商品链接取首次出现的值；frame 已有商品键列时直接使用，价格区间缺失的行不计入。
+    """
+    keys = frame['商品键'] if '商品键' in frame.columns else product_keys(frame)
+    return frame.groupby([frame['价格区间'], keys], observed=True, sort=False).agg(
+        商品标题=('商品标题', 'first'), 商品链接=('商品链接', 'first'),
+        销售额=('销售额', 'sum'), 销量=('销量', 'sum'))
+
+
+def top_products_from_index(index, n=5):
+    """由商品索引取出各价位段销售额前 n 的商品"""
+    return grouped_top_n(index.reset_index(), '价格区间', '销售额', n)[PRODUCT_COLUMNS]
+
+
+class SliceIndex:
+    """(品牌 × 价格区间) 行位置索引，用于按品牌、价格区间和时间范围快速筛选
+
+    构建时按组编号对行位置做一次稳定排序，并记录每组在排序结果中的起止位置；
+    查询切片时只取所选各组的行位置，不对整表做布尔筛选。frame 需已完成分箱且品牌为分类类型。
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.brands = frame['品牌'].cat.categories
+        self.labels = frame['价格区间'].cat.categories
+        # 编号加1，使缺失的品牌或价格区间（编号-1）对应第0组
+        self.brand_codes = frame['品牌'].cat.codes.to_numpy(dtype=np.int64) + 1
+        self.range_codes = frame['价格区间'].cat.codes.to_numpy(dtype=np.int64) + 1
+        self.n_ranges = len(self.labels) + 1
+        groups = self.brand_codes * self.n_ranges + self.range_codes
+        self.order = np.argsort(groups, kind='stable')
+        counts = np.bincount(groups, minlength=(len(self.brands) + 1) * self.n_ranges)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.sales = frame['销售额'].to_numpy(dtype=float)
+        self.volume = frame['销量'].to_numpy(dtype=float)
+        self.periods = frame['周期'].to_numpy()
+
+    @staticmethod
+    def _codes(values, categories):
+        """将所选取值转为编号；None 表示全部（含缺失）"""
+        if values is None:
+            return np.arange(len(categories) + 1)
+        return np.array([categories.get_loc(value) + 1 for value in values if value in categories],
+                        dtype=np.int64)
+
+    def positions(self, brands=None, price_ranges=None, start=None, end=None):
+        """返回切片内的行位置；start、end 为周期范围（左闭右开），指定时间范围时不含无周期的行"""
+        if brands is None and price_ranges is None:
+            positions = np.arange(len(self.frame))
+        else:
+            groups = (self._codes(brands, self.brands)[:, None] * self.n_ranges
+                      + self._codes(price_ranges, self.labels)[None, :]).ravel()
+            groups.sort()
+            slices = [self.order[self.offsets[group]:self.offsets[group + 1]] for group in groups]
+            positions = np.concatenate(slices) if slices else np.array([], dtype=np.int64)
+        if start is not None or end is not None:
+            periods = self.periods[positions]
+            keep = ~np.isnat(periods)
+            if start is not None:
+                keep &= periods >= np.datetime64(pd.Timestamp(start))
+            if end is not None:
+                keep &= periods < np.datetime64(pd.Timestamp(end))
+            positions = positions[keep]
+        return positions
+
+    def summary(self, top_n=5, **filters):
+        """切片的合计、品牌和价格区间分布及各价位段TOP N商品，filters 同 positions
+
+        品牌和价格区间分布对切片内各行的编号做 bincount，商品排行只汇总切片内的行。
+        """
+        positions = self.positions(**filters)
+        sales, volume = self.sales[positions], self.volume[positions]
+
+        def breakdown(codes, categories, name):
+            size = len(categories) + 1
+            table = pd.DataFrame({
+                '销售额': np.bincount(codes, weights=np.nan_to_num(sales), minlength=size)[1:],
+                '销量': np.bincount(codes, weights=np.nan_to_num(volume), minlength=size)[1:],
+            }, index=pd.Index(categories, name=name))
+            return table[(table['销售额'] != 0) | (table['销量'] != 0)]
+
+        return {
+            'rows': len(positions),
+            'total_sales': float(np.nansum(sales)),
+            'total_volume': float(np.nansum(volume)),
+            'brand': breakdown(self.brand_codes[positions], self.brands, '品牌')
+                .sort_values('销售额', ascending=False),
+            'price_range': breakdown(self.range_codes[positions], self.labels, '价格区间'),
+            'top_products': top_products_from_index(
+                build_product_index(self.frame.iloc[positions]), top_n),
+        }
+
+
+def _edge_label(lower, upper):
+    """价格区间 (lower, upper] 的显示标签，如 100-200、1000+"""
+    if np.isinf(upper):
+        return f'{lower:g}+'
+    if np.isinf(lower):
+        return f'≤{upper:g}'
+    return f'{lower:g}-{upper:g}'
+
+
+class PriceBinning:
+    """价格分箱：区间为左开右闭 (edges[i], edges[i+1]]，与 pd.cut 默认规则一致"""
+
+    def __init__(self, edges=PRICE_RANGES, labels=None):
+        edges = [float(edge) for edge in edges]
+        if len(edges) < 2 or any(a >= b for a, b in zip(edges, edges[1:])):
+            raise ValueError(f"价格区间边界必须严格递增且至少两个：{edges}")
+        if labels is None:
+            labels = [_edge_label(a, b) for a, b in zip(edges, edges[1:])]
+        if len(labels) != len(edges) - 1:
+            raise ValueError("价格区间标签数量必须比边界少一个")
+        self.edges = edges
+        self.labels = list(labels)
+        self.dtype = pd.CategoricalDtype(self.labels, ordered=True)
+
+    @classmethod
+    def from_quantiles(cls, prices, q=5):
+        """按价格分位数划分 q 个区间；边界保留两位小数，重复边界会被合并"""
+        prices = pd.to_numeric(pd.Series(prices), errors='coerce').dropna()
+        if prices.empty:
+            raise ValueError("没有有效价格，无法按分位数分箱")
+        inner = prices.quantile(np.linspace(0, 1, q + 1)[1:-1]).round(2)
+        lower = 0.0 if prices.min() > 0 else float('-inf')
+        edges = sorted({lower, *inner.tolist(), float('inf')})
+        return cls(edges)
+
+    @property
+    def key(self):
+        """标识当前分箱方案，用于判断已缓存的价格区间列是否过期"""
+        return tuple(self.edges), tuple(self.labels)
+
+    def assign(self, prices):
+        """用 searchsorted 为每个价格二分查找所属区间，返回分类类型的价格区间列"""
+        values = pd.to_numeric(prices, errors='coerce').to_numpy(dtype=float)
+        codes = np.searchsorted(self.edges, values, side='left') - 1
+        # 不在任何区间内（不大于最小边界、超过最大边界或缺失）的价格记为缺失
+        codes[(codes < 0) | (codes >= len(self.labels)) | np.isnan(values)] = -1
+        categorical = pd.Categorical.from_codes(codes, dtype=self.dtype)
+        return pd.Series(categorical, index=prices.index, name='价格区间')
+
+
+class SpaceSavingSketch:
+    """加权Space-Saving重项草图：最多跟踪 capacity 个键，按 weight 列累加，估计值只会高估
+
+    每个被跟踪的键记录估计值和误差（“误差”列），真实值位于 [估计值 - 误差, 估计值]；
+    未被跟踪的键真实值不超过 min_count，且 min_count 不超过 总权重 / capacity。
+    sums 中的列只在键被跟踪期间累加（为下界），firsts 中的列保留首次出现的取值。
+    数据按块合并：块内先按键精确汇总，再与已有计数器合并，保留估计值最大的 capacity 个键。
+    """
+
+    def __init__(self, capacity, key, weight, sums=(), firsts=()):
+        if capacity < 1:
+            raise ValueError(f"草图容量必须为正整数：{capacity}")
+        self.capacity = capacity
+        self.key = key
+        self.weight = weight
+        self.sums = list(sums)
+        self.firsts = list(firsts)
+        self.total = 0.0
+        self.counters = None
+
+    @property
+    def min_count(self):
+        """未被跟踪的键的真实值上界；计数器未满时为0"""
+        if self.counters is None or len(self.counters) < self.capacity:
+            return 0.0
+        return float(self.counters[self.weight].min())
+
+    def update(self, frame):
+        """合并一个数据块；键缺失的行不计入"""
+        agg = {self.weight: 'sum', **{column: 'sum' for column in self.sums},
+               **{column: 'first' for column in self.firsts}}
+        chunk = frame.groupby(self.key, observed=True, sort=False).agg(agg)
+        chunk['误差'] = 0.0
+        self.total += float(chunk[self.weight].sum())
+        if self.counters is not None:
+            # 不在已有计数器中的键，此前的真实值最多为 min_count
+            floor = self.min_count
+            old, new = self.counters.align(chunk, join='outer')
+            chunk = old[self.firsts].combine_first(new[self.firsts])
+            chunk[self.weight] = old[self.weight].fillna(floor) + new[self.weight].fillna(0)
+            for column in self.sums:
+                chunk[column] = old[column].fillna(0) + new[column].fillna(0)
+            chunk['误差'] = old['误差'].fillna(floor) + new['误差'].fillna(0)
+        self.counters = chunk.nlargest(self.capacity, self.weight)
+
+    def estimates(self):
+        """按估计值降序返回被跟踪的键"""
+        columns = [self.weight] + self.sums + self.firsts + ['误差']
+        if self.counters is None:
+            return pd.DataFrame(columns=columns).rename_axis(self.key)
+        return self.counters[columns].sort_values(self.weight, ascending=False)
+
+    def bounds(self):
+        """误差范围：任一键估计值的高估量都不超过 max_error"""
+        return {
+            'capacity': self.capacity,
+            'tracked': 0 if self.counters is None else len(self.counters),
+            'total': self.total,
+            'max_error': self.min_count,
+            'relative_error': self.min_count / self.total if self.total else 0.0,
+        }
+
+
+class StreamingAggregator:
+    """增量聚合器：逐块累加(品牌 × 价格区间)立方体，并维护各价位段TOP N商品
+
+    商品按商品键累加销售额和销量，累加结果只保存数值列，标题和链接只为当前TOP N商品保留；
+    每块只按位置累加并在候选商品中重新选取TOP N，不再对全部商品重新分组。
+    精确模式下累加结果的大小与不同商品数成正比，需要限定内存时使用近似模式。
+
+    capacity 不为None时为近似模式：品牌和各价位段商品改用容量为 capacity 的 SpaceSavingSketch 统计，
+    立方体中未被跟踪的品牌合并为 OTHER_BRAND，内存占用与品牌和商品数量无关；
+    总计、各价位段和各周期合计仍为精确值。
+    """
+
+    def __init__(self, price_ranges, price_labels, top_n=5, capacity=None):
+        self.binning = PriceBinning(price_ranges, price_labels)
+        self.top_n = top_n
+        self.capacity = capacity
+        self.rows = 0
+        self.cube = None
+        self.top_products = None
+        self.product_totals = None
+        self.brand_sketch = None
+        self.product_sketches = {}
+        if capacity is not None:
+            self.brand_sketch = SpaceSavingSketch(capacity, '品牌', '销售额', sums=['销量'])
+            self.product_sketches = {
+                label: SpaceSavingSketch(capacity, '商品键', '销售额', sums=['销量'],
+                                         firsts=['商品标题', '商品链接'])
+                for label in self.binning.labels
+            }
+
+    def _fold_brands(self, frame):
+        """近似模式下将未被跟踪的品牌（含缺失品牌）合并为 OTHER_BRAND"""
+        tracked = frame['品牌'].isin(self.brand_sketch.counters.index)
+        frame['品牌'] = frame['品牌'].astype(object).where(tracked, OTHER_BRAND)
+        return frame
+
+    def update(self, chunk):
+        """累加一个数据块"""
+        chunk = chunk.copy()
+        for column in ('销售额', '销量', '价格'):
+            chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+        add_period_column(chunk)
+        chunk['价格区间'] = self.binning.assign(chunk['价格'])
+        self.rows += len(chunk)
+
+        if self.capacity is not None:
+            # 商品与精确模式和存储一样按商品键统计，没有链接的商品按标题计入
+            chunk['商品键'] = product_keys(chunk)
+            self.brand_sketch.update(chunk)
+            for label, group in chunk.groupby('价格区间', observed=True):
+                self.product_sketches[label].update(group)
+            self._fold_brands(chunk)
+
+        cube = build_cube(chunk)
+        if self.cube is not None:
+            merged = pd.concat([self.cube.reset_index(), cube.reset_index()], ignore_index=True)
+            merged['价格区间'] = merged['价格区间'].astype(self.binning.dtype)
+            if self.capacity is not None:
+                # 之前跟踪、本块后被淘汰的品牌也一并合并
+                self._fold_brands(merged)
+            cube = build_cube(merged)
+        self.cube = cube
+
+        if self.capacity is not None:
+            return
+        products = build_product_index(chunk)
+        totals = products[['销售额', '销量']]
+        labels = products.reset_index()[['商品键', '商品标题', '商品链接']]
+        if self.product_totals is None:
+            self.product_totals = totals
+            candidates = np.arange(len(totals))
+        else:
+            candidates = self._merge_product_totals(totals)
+            labels = pd.concat([self.top_products[labels.columns], labels], ignore_index=True)
+
+        # 商品只会在本身销售额增加的块中进入TOP N，只需在上一轮TOP N和本块商品中重新选取，
+        # 其标题和链接也总能在这两者中找到；出现负销售额时退回到全量选取
+        if (totals['销售额'] < 0).any():
+            candidates = np.arange(len(self.product_totals))
+        candidates = self.product_totals.iloc[candidates].sort_index()
+        top = grouped_top_n(candidates.reset_index(), '价格区间', '销售额', self.top_n)
+        self.top_products = top.merge(labels.drop_duplicates('商品键'), on='商品键', how='left')[
+            PRODUCT_COLUMNS + ['商品键']]
+
+    def _merge_product_totals(self, totals):
+        """将本块各商品的合计按位置累加进 product_totals，新商品追加在末尾
+
+        返回本块商品和上一轮TOP N商品在合并后 product_totals 中的位置。
+        """
+        existing = self.product_totals
+        positions = existing.index.get_indexer(totals.index)
+        seen = positions >= 0
+        columns = {}
+        for column in totals.columns:
+            dtype = np.result_type(existing[column].dtype, totals[column].dtype)
+            values = existing[column].to_numpy(dtype=dtype, copy=True)
+            values[positions[seen]] += totals[column].to_numpy(dtype=dtype)[seen]
+            columns[column] = values
+        merged = pd.DataFrame(columns, index=existing.index)
+        new = totals[~seen]
+        if len(new):
+            merged = pd.concat([merged, new.astype(merged.dtypes)])
+            positions[~seen] = np.arange(len(existing), len(merged))
+        self.product_totals = merged
+
+        top = pd.MultiIndex.from_frame(self.top_products[['价格区间', '商品键']])
+        previous = existing.index.get_indexer(top)
+        return np.unique(np.concatenate([positions, previous[previous >= 0]]))
+
+    def _sketch_top_products(self):
+        """由各价位段商品草图取出TOP N商品，附带销售额误差"""
+        frames = []
+        for label, sketch in self.product_sketches.items():
+            top = sketch.estimates().head(self.top_n).reset_index()
+            top.insert(0, '价格区间', label)
+            frames.append(top)
+        top_products = pd.concat(frames, ignore_index=True)
+        top_products['价格区间'] = top_products['价格区间'].astype(self.binning.dtype)
+        return top_products[PRODUCT_COLUMNS + ['误差']].rename(columns={'误差': '销售额误差'})
+
+    def approximation(self):
+        """近似模式下各草图的误差范围，精确模式返回None"""
+        if self.capacity is None:
+            return None
+        bounds = {'品牌': self.brand_sketch.bounds()}
+        for label, sketch in self.product_sketches.items():
+            bounds[f'{label}商品'] = sketch.bounds()
+        return bounds
+
+    def result(self):
+        """返回与 LampAnalysis.get_aggregates 结构相同的汇总结果
+
+        近似模式下 brand 和 top_products 来自草图并带有“销售额误差”列，
+        brand_range 不含 OTHER_BRAND，另外在 approximation 中给出各草图的误差范围。
+        """
+        if self.cube is None:
+            raise ValueError("没有读取到任何数据行")
+        if self.capacity is None:
+            return summarize_cube(self.cube, self.top_products.drop(columns='商品键'))
+        aggregates = summarize_cube(self.cube, self._sketch_top_products())
+        aggregates['brand_range'] = aggregates['brand_range'].drop(
+            OTHER_BRAND, level='品牌', errors='ignore')
+        aggregates['brand'] = self.brand_sketch.estimates().rename(columns={'误差': '销售额误差'})
+        aggregates['approximation'] = self.approximation()
+        return aggregates
+
+    def state(self):
+        """导出可持久化的累加状态"""
+        return {
+            'price_ranges': self.binning.edges,
+            'price_labels': self.binning.labels,
+            'top_n': self.top_n,
+            'capacity': self.capacity,
+            'rows': self.rows,
+            'cube': self.cube,
+            'top_products': self.top_products,
+            'product_totals': self.product_totals,
+            'brand_sketch': self.brand_sketch,
+            'product_sketches': self.product_sketches,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """从 state() 导出的状态恢复聚合器，之后可继续累加新数据"""
+        aggregator = cls(state['price_ranges'], state['price_labels'], state['top_n'],
+                         state.get('capacity'))
+        if aggregator.capacity is not None:
+            aggregator.brand_sketch = state['brand_sketch']
+            aggregator.product_sketches = state['product_sketches']
+        aggregator.rows = state['rows']
+        aggregator.cube = state['cube']
+        aggregator.top_products = state['top_products']
+        aggregator.product_totals = state['product_totals']
+        return aggregator
+
+
+def load_store(store_path):
+    """读取增量聚合存储，不存在时返回None"""
+    store_path = Path(store_path)
+    if not store_path.exists():
+        return None
+    return pd.read_pickle(store_path)
+
+
+def update_store(store_path, file_path, chunksize=100000, price_bins=None):
+    """将一个新工作簿的数据合并进增量聚合存储，只处理新文件的行
+
+    存储中记录已合并文件的内容哈希，重复合并同一文件会被跳过。返回本次新增的行数。
+    price_bins 为新建存储时使用的价格区间边界，已有存储沿用其中的分箱方案。
+    """
+    store_path = Path(store_path)
+    store = load_store(store_path) or {'sources': {}, 'state': None}
+    digest = file_digest(file_path)
+    if digest in store['sources']:
+        print(f"{Path(file_path).name} 已合并过，跳过")
+        return 0
+
+    if store['state'] is None:
+        binning = PriceBinning(PRICE_RANGES, PRICE_LABELS) if price_bins is None else PriceBinning(price_bins)
+        aggregator = StreamingAggregator(binning.edges, binning.labels)
+    else:
+        aggregator = StreamingAggregator.from_state(store['state'])
+    rows_before = aggregator.rows
+    for chunk in iter_chunks(file_path, chunksize=chunksize):
+        aggregator.update(chunk)
+    added = aggregator.rows - rows_before
+
+    store['state'] = aggregator.state()
+    store['sources'][digest] = {'file': Path(file_path).name, 'rows': added}
+    # 写入中断时不会损坏已有存储
+    atomic_write_bytes(store_path, pickle.dumps(store, protocol=pickle.HIGHEST_PROTOCOL))
+    print(f"已合并 {Path(file_path).name}：新增 {added:,} 行，累计 {aggregator.rows:,} 行")
+    return added
+
+
+DATABASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    digest TEXT UNIQUE NOT NULL,
+    file TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    分箱 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sales (
+    来源 INTEGER NOT NULL REFERENCES sources(id),
+    时间 TEXT,
+    周期 TEXT,
+    商品标题 TEXT,
+    商品链接 TEXT,
+    商品键 INTEGER,
+    品牌 TEXT,
+    价格 REAL,
+    销售额 REAL,
+    销量 REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sales_brand ON sales (品牌);
+CREATE INDEX IF NOT EXISTS idx_sales_price ON sales (价格);
+CREATE INDEX IF NOT EXISTS idx_sales_period ON sales (周期);
+CREATE TABLE IF NOT EXISTS cube (
+    来源 INTEGER NOT NULL REFERENCES sources(id),
+    周期 TEXT,
+    品牌 TEXT,
+    价格区间 INTEGER,
+    销售额 REAL,
+    销量 REAL
+);
+CREATE TABLE IF NOT EXISTS products (
+    来源 INTEGER NOT NULL REFERENCES sources(id),
+    价格区间 INTEGER NOT NULL,
+    商品键 INTEGER,
+    商品标题 TEXT,
+    商品链接 TEXT,
+    销售额 REAL,
+    销量 REAL
+);
+"""
+
+
+def connect_database(db_path):
+    """打开（必要时创建）本地SQLite数据库并确保表和索引存在"""
+    connection = sqlite3.connect(db_path)
+    connection.executescript(DATABASE_SCHEMA)
+    return connection
+
+
+def _insert_rows(connection, table, frame):
+    """直接 executemany 写入，不经 to_sql（其每次调用都会单独提交）
+
+    按列 tolist 转为Python对象再组合成行，比 itertuples 逐个取值快；缺失值（NaN）由SQLite存为NULL。
+    """
+    connection.executemany(
+        f"INSERT INTO {table} ({', '.join(frame.columns)}) "
+        f"VALUES ({', '.join('?' * len(frame.columns))})",
+        zip(*(frame[column].tolist() for column in frame.columns)))
+
+
+def _range_codes(ranges):
+    """价格区间分类转为区间编号，不在任何区间内时为NaN（写入数据库为NULL）"""
+    codes = pd.Series(ranges.cat.codes, index=ranges.index)
+    return codes.where(codes >= 0)
+
+
+def ingest_database(db_path, file_path, chunksize=100000, price_bins=None):
+    """将一个导出文件分块写入数据库，返回新增行数
+
+    时间列额外解析为周期（YYYY-MM-DD）并建立索引；已导入过的文件（按内容哈希判断）会被跳过。
+    除明细外，同时按 price_bins（默认价格区间）预先汇总该文件的(周期 × 品牌 × 价格区间)立方体
+    和各商品累计结果，不带筛选条件的报告查询直接读取预汇总表。
+    一个文件在单个事务中写入，中途失败不会留下部分数据。
+    """
+    binning = PriceBinning(PRICE_RANGES, PRICE_LABELS) if price_bins is None else PriceBinning(price_bins)
+    digest = file_digest(file_path)
+    connection = connect_database(db_path)
+    try:
+        if connection.execute('SELECT 1 FROM sources WHERE digest = ?', (digest,)).fetchone():
+            print(f"{Path(file_path).name} 已导入过，跳过")
+            return 0
+        with connection:
+            source_id = connection.execute(
+                'INSERT INTO sources (digest, file, rows, 分箱) VALUES (?, ?, 0, ?)',
+                (digest, Path(file_path).name, json.dumps(binning.edges))).lastrowid
+            rows = 0
+            for chunk in iter_chunks(file_path, chunksize=chunksize):
+                for column in ('销售额', '销量', '价格'):
+                    chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+                add_period_column(chunk)
+                # SQLite整数为有符号64位，哈希值按位解释为int64保存
+                chunk['商品键'] = product_keys(chunk).to_numpy().view(np.int64)
+                chunk['价格区间'] = binning.assign(chunk['价格'])
+                frame = pd.DataFrame({
+                    '来源': source_id,
+                    '时间': chunk['时间'].astype(str).where(chunk['时间'].notna()) if '时间' in chunk else None,
+                    '周期': chunk['周期'].dt.strftime('%Y-%m-%d'),
+                    '商品标题': chunk['商品标题'],
+                    '商品链接': chunk['商品链接'],
+                    '商品键': chunk['商品键'],
+                    '品牌': chunk['品牌'],
+                    '价格': chunk['价格'],
+                    '销售额': chunk['销售额'],
+                    '销量': chunk['销量'],
+                }, index=chunk.index)
+                _insert_rows(connection, 'sales', frame)
+
+                # 预汇总按块写入，查询时再跨块、跨文件求和
+                cube = build_cube(chunk).reset_index()
+                _insert_rows(connection, 'cube', pd.DataFrame({
+                    '来源': source_id,
+                    '周期': cube['周期'].dt.strftime('%Y-%m-%d'),
+                    '品牌': cube['品牌'],
+                    '价格区间': _range_codes(cube['价格区间']),
+                    '销售额': cube['销售额'],
+                    '销量': cube['销量'],
+                }))
+                # 与 build_product_index 一样取首次出现的标题和链接（字符串的 min 没有向量化实现）
+                products = chunk.groupby(['价格区间', '商品键'], observed=True, sort=False).agg(
+                    商品标题=('商品标题', 'first'), 商品链接=('商品链接', 'first'),
+                    销售额=('销售额', 'sum'), 销量=('销量', 'sum')).reset_index()
+                products['价格区间'] = _range_codes(products['价格区间'])
+                products.insert(0, '来源', source_id)
+                _insert_rows(connection, 'products', products)
+                rows += len(frame)
+            connection.execute('UPDATE sources SET rows = ? WHERE id = ?', (rows, source_id))
+    finally:
+        connection.close()
+    print(f"已导入 {Path(file_path).name}：{rows:,} 行")
+    return rows
+
+
+def _price_range_sql(binning):
+    """价格区间的SQL表达式，返回区间编号（从0开始），不在任何区间内时为NULL"""
+    cases = []
+    for code, (lower, upper) in enumerate(zip(binning.edges, binning.edges[1:])):
+        conditions = ['价格 IS NOT NULL']
+        if not np.isinf(lower):
+            conditions.append(f'价格 > {lower!r}')
+        if not np.isinf(upper):
+            conditions.append(f'价格 <= {upper!r}')
+        cases.append(f"WHEN {' AND '.join(conditions)} THEN {code}")
+    return f"CASE {' '.join(cases)} END"
+
+
+def _sales_filter(brands=None, start=None, end=None, min_price=None, max_price=None):
+    """根据筛选条件生成 WHERE 子句和参数；条件列均有索引"""
+    conditions, params = [], []
+    if brands is not None:
+        brands = list(brands)
+        conditions.append(f"品牌 IN ({', '.join('?' * len(brands))})")
+        params.extend(brands)
+    if start is not None:
+        conditions.append('周期 >= ?')
+        params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+    if end is not None:
+        conditions.append('周期 < ?')
+        params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+    if min_price is not None:
+        conditions.append('价格 > ?')
+        params.append(float(min_price))
+    if max_price is not None:
+        conditions.append('价格 <= ?')
+        params.append(float(max_price))
+    return ('WHERE ' + ' AND '.join(conditions)) if conditions else '', params
+
+
+def query_database(db_path, sql, params=()):
+    """在数据库上执行任意查询并返回DataFrame，用于临时分析"""
+    connection = connect_database(db_path)
+    try:
+        return pd.read_sql_query(sql, connection, params=list(params))
+    finally:
+        connection.close()
+
+
+def _preaggregated(connection, binning):
+    """全部已导入文件都按 binning 的价格区间预汇总过时返回True"""
+    mismatched = connection.execute('SELECT COUNT(*) FROM sources WHERE 分箱 != ?',
+                                    (json.dumps(binning.edges),)).fetchone()[0]
+    return mismatched == 0
+
+
+def query_aggregates(db_path, binning, top_n=5, **filters):
+    """在数据库中以聚合查询计算各项分析所需的汇总表，结构与 LampAnalysis.get_aggregates 相同
+
+    分箱和分组求和都在SQL中完成，只有(周期 × 品牌 × 价格区间)立方体和各价位段TOP N商品被读回。
+    filters 可指定 brands、start、end（周期范围，左闭右开）、min_price、max_price，筛选条件列均有索引；
+    没有筛选条件且分箱方案与导入时相同时直接读取导入时的预汇总表，不扫描明细。
+    """
+    connection = connect_database(db_path)
+    try:
+        if all(value is None for value in filters.values()) and _preaggregated(connection, binning):
+            params = []
+            cube_sql = """
+                SELECT 周期, 品牌, 价格区间, SUM(销售额) AS 销售额, SUM(销量) AS 销量
+                FROM cube GROUP BY 1, 2, 3
+            """
+            products = """
+                SELECT 价格区间, 商品键, MIN(商品标题) AS 商品标题, MIN(商品链接) AS 商品链接,
+                       SUM(销售额) AS 销售额, SUM(销量) AS 销量
+                FROM products GROUP BY 1, 2
+            """
+        else:
+            where, params = _sales_filter(**filters)
+            price_range = _price_range_sql(binning)
+            cube_sql = f"""
+                SELECT 周期, 品牌, {price_range} AS 价格区间, SUM(销售额) AS 销售额, SUM(销量) AS 销量
+                FROM sales {where} GROUP BY 1, 2, 3
+            """
+            products = f"""
+                SELECT {price_range} AS 价格区间, 商品键, MIN(商品标题) AS 商品标题,
+                       MIN(商品链接) AS 商品链接, SUM(销售额) AS 销售额, SUM(销量) AS 销量
+                FROM sales {where} GROUP BY 1, 2
+            """
+        products_sql = f"""
+            SELECT 价格区间, 商品标题, 商品链接, 销售额, 销量 FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY 价格区间 ORDER BY 销售额 DESC) AS 排名
+                FROM ({products}) WHERE 价格区间 IS NOT NULL
+            ) WHERE 排名 <= ? ORDER BY 价格区间, 排名
+        """
+        cube = pd.read_sql_query(cube_sql, connection, params=params)
+        top_products = pd.read_sql_query(products_sql, connection, params=params + [top_n])
+    finally:
+        connection.close()
+    if cube.empty:
+        raise ValueError(f"数据库中没有符合条件的数据：{db_path}")
+
+    def to_range(codes):
+        return pd.Categorical.from_codes(codes.fillna(-1).astype(int), dtype=binning.dtype)
+
+    cube['周期'] = pd.to_datetime(cube['周期'])
+    cube['价格区间'] = to_range(cube['价格区间'])
+    top_products['价格区间'] = to_range(top_products['价格区间'])
+    return summarize_cube(build_cube(cube), top_products)
+
+
+def _with_range_shares(frame, total_sales, total_volume, range_totals):
+    """为各价位段TOP N结果补充占总体和占所在价位段的比例，并按价格区间排序"""
+    frame = frame.sort_values('价格区间', kind='stable').reset_index(drop=True)
+    range_sales = frame['价格区间'].map(range_totals['销售额']).astype(float)
+    range_volume = frame['价格区间'].map(range_totals['销量']).astype(float)
+    frame['销售额占总体比例'] = frame['销售额'] / total_sales * 100
+    frame['销量占总体比例'] = frame['销量'] / total_volume * 100
+    frame['销售额占价位段比例'] = frame['销售额'] / range_sales * 100
+    frame['销量占价位段比例'] = frame['销量'] / range_volume * 100
+    return frame[['价格区间'] + [column for column in frame.columns if column != '价格区间']]
+
+
+def write_excel_report(tables):
+    """将 {工作表名: DataFrame} 写成Excel文件并返回字节
+
+    优先使用xlsxwriter的constant_memory模式逐行流式写入；未安装xlsxwriter时退回pandas默认引擎。
+    """
+    buffer = io.BytesIO()
+    try:
+        import xlsxwriter
+    except ImportError:
+        with pd.ExcelWriter(buffer) as writer:
+            for sheet_name, frame in tables.items():
+                frame.to_excel(writer, sheet_name=sheet_name, index=False)
+        return buffer.getvalue()
+
+    workbook = xlsxwriter.Workbook(buffer, {'constant_memory': True, 'nan_inf_to_errors': True})
+    header_format = workbook.add_format({'bold': True})
+    for sheet_name, frame in tables.items():
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, [str(column) for column in frame.columns], header_format)
+        # constant_memory 模式要求按行顺序写入；缺失值写为空单元格
+        values = frame.astype(object).where(frame.notna(), None)
+        for row_number, row in enumerate(values.itertuples(index=False, name=None), start=1):
+            worksheet.write_row(row_number, 0, row)
+    workbook.close()
+    return buffer.getvalue()
+
+
+def tables_to_json(tables):
+    """将 {表名: DataFrame} 转为 {表名: [行记录]} 的JSON文本，缺失值写为null"""
+    data = {
+        name: json.loads(frame.to_json(orient='records', force_ascii=False, date_format='iso'))
+        for name, frame in tables.items()
+    }
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def write_tables(tables, fmt, output_dir):
+    """每张表写成 output_dir 下的一个CSV或Parquet文件，返回 {表名: 文件路径}"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for name, frame in tables.items():
+        path = output_dir / f'{name}.{fmt}'
+        if fmt == 'csv':
+            frame.to_csv(path, index=False)
+        elif fmt == 'parquet':
+            frame.to_parquet(path, index=False)
+        else:
+            raise ValueError(f"不支持的输出格式：{fmt}")
+        paths[name] = path
+    return paths
+
+
+def format_tables(tables, fmt, output_dir):
+    """按结构化格式输出结果表，返回写到标准输出的JSON文本
+
+    json 时为全部表的内容；parquet/csv 时写入 output_dir，返回 {表名: 文件路径}。
+    """
+    if fmt == 'json':
+        return tables_to_json(tables)
+    paths = write_tables(tables, fmt, output_dir)
+    return json.dumps({name: str(path) for name, path in paths.items()}, ensure_ascii=False, indent=2)
+
 
 class LampAnalysis:
-    def __init__(self, file_path):
-        self.df = pd.read_excel(file_path)
-        print("Excel文件的列名：", self.df.columns)  # 添加这行来查看列名
-        self.price_ranges = [0, 100, 200, 300, 400, 500, 800, 1000, float('inf')]
-        self.price_labels = ['0-100', '100-200', '200-300', '300-400', 
-                           '400-500', '500-800', '800-1000', '1000+']
+    def __init__(self, file_path, use_cache=True, streaming=False, chunksize=100000,
+                 output_dir='.', approximate=None, price_bins=None):
+        """file_path 可以是路径、bytes或文件对象；output_dir 为None时报告和图表只保留在内存中
+
+        file_path 为None时不加载数据，用于从已有聚合结果构建分析器（见 from_store）。
+        approximate 为草图容量，指定时以流式近似模式读取，品牌和商品排行为带误差范围的估计值。
+        price_bins 为自定义价格区间边界；流式和近似模式读取时即完成分箱，之后无法再更换。
+        """
+        self.output_dir = None if output_dir is None else Path(output_dir)
+        if self.output_dir is not None:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.report_bytes = None
+        self.report_tables = None
+        self.chart_bytes = {}
+        self.binning = (PriceBinning(PRICE_RANGES, PRICE_LABELS) if price_bins is None
+                        else PriceBinning(price_bins))
+        self._binned_key = None
+        self.trend_freq = TREND_FREQS['month']
+        self._aggregates = None
+        self._product_index = None
+        self._slice_index = None
+        # 流式读取或从存储恢复时保留聚合器，save_store 据此保存完整的累加状态
+        self._aggregator = None
+        self.database = None
         
+        if file_path is None:
+            self.df = None
+            self.rows = 0
+        elif streaming or approximate is not None:
+            # 流式模式不保留明细数据，读取时直接完成分箱和聚合
+            self.df = None
+            aggregator = StreamingAggregator(self.price_ranges, self.price_labels,
+                                             capacity=approximate)
+            for chunk in iter_chunks(file_path, chunksize=chunksize):
+                aggregator.update(chunk)
+            self._aggregator = aggregator
+            self._aggregates = aggregator.result()
+            self.rows = aggregator.rows
+            print(f"流式读取完成，共 {aggregator.rows} 行")
+        else:
+            self.df = read_excel_cached(file_path, use_cache=use_cache)
+            self.rows = len(self.df)
+            before = self.df.memory_usage(deep=True).sum()
+            rss_before = current_rss()
+            self.df = apply_schema(self.df)
+            self.memory_report = {
+                'rows': len(self.df),
+                'frame_bytes_before': int(before),
+                'frame_bytes_after': int(self.df.memory_usage(deep=True).sum()),
+                'rss_before': rss_before,
+                'rss_after': current_rss(),
+            }
+            
+    @classmethod
+    def from_store(cls, store_path, output_dir='.'):
+        """从增量聚合存储构建分析器，各项分析直接使用存储中的聚合结果"""
+        store = load_store(store_path)
+        if store is None or store['state'] is None:
+            raise ValueError(f"聚合存储不存在或为空：{store_path}")
+        state = store['state']
+        analyzer = cls(None, output_dir=output_dir)
+        analyzer.binning = PriceBinning(state['price_ranges'], state['price_labels'])
+        analyzer.rows = state['rows']
+        analyzer._aggregator = StreamingAggregator.from_state(state)
+        analyzer._aggregates = analyzer._aggregator.result()
+        return analyzer
+
+    @classmethod
+    def from_database(cls, db_path, output_dir='.', price_bins=None):
+        """基于本地数据库构建分析器，各项分析通过聚合查询在数据库中完成，不加载明细数据"""
+        if not Path(db_path).exists():
+            raise ValueError(f"数据库不存在：{db_path}")
+        analyzer = cls(None, output_dir=output_dir, price_bins=price_bins)
+        analyzer.database = Path(db_path)
+        analyzer.rows = int(query_database(db_path, 'SELECT COUNT(*) AS 行数 FROM sales')['行数'].iloc[0])
+        return analyzer
+
+    def save_store(self, store_path):
+        """将当前分析器的聚合结果保存为增量聚合存储，之后可用 update_store 继续合并新文件
+
+        存储需要全部商品的累计销售额，之后合并新文件时TOP N商品才准确；
+        数据库模式下没有这些累计结果，无法保存。
+        """
+        if self._aggregator is not None:
+            aggregator = self._aggregator
+        elif self.df is not None:
+            aggregates = self.get_aggregates()
+            aggregator = StreamingAggregator(self.price_ranges, self.price_labels)
+            aggregator.rows = self.rows
+            aggregator.cube = aggregates['cube']
+            top_products = aggregates['top_products'].reset_index(drop=True)
+            top_products['商品键'] = product_keys(top_products)
+            aggregator.top_products = top_products
+            aggregator.product_totals = self.get_product_index()[['销售额', '销量']]
+        else:
+            raise ValueError("数据库模式下没有各商品的累计结果，无法保存为增量聚合存储")
+        store = {'sources': {}, 'state': aggregator.state()}
+        atomic_write_bytes(store_path, pickle.dumps(store, protocol=pickle.HIGHEST_PROTOCOL))
+        
+    def print_memory_report(self):
+        """打印加载时类型压缩前后的内存占用"""
+        report = getattr(self, 'memory_report', None)
+        if report is None:
+            print("未在内存中保留明细数据，无内存占用报告")
+            return
+        mb = 1024 * 1024
+        print("\n=== 内存占用 ===")
+        print(f"数据行数：{report['rows']:,}")
+        print(f"数据表：{report['frame_bytes_before'] / mb:,.2f} MB -> "
+              f"{report['frame_bytes_after'] / mb:,.2f} MB")
+        if report['rss_before'] is not None:
+            print(f"进程内存：{report['rss_before'] / mb:,.2f} MB -> "
+                  f"{report['rss_after'] / mb:,.2f} MB")
+        
+    def _output_path(self, file_name):
+        """输出文件在输出目录下的路径，未设置输出目录时返回None"""
+        if self.output_dir is None:
+            return None
+        return self.output_dir / file_name
+        
+    @property
+    def price_ranges(self):
+        return self.binning.edges
+
+    @property
+    def price_labels(self):
+        return self.binning.labels
+
+    def set_price_bins(self, edges=None, labels=None, quantiles=None):
+        """更换价格分箱方案：指定边界（及可选标签），或按价格分位数划分 quantiles 个区间
+
+        只重新计算价格区间列和聚合结果，不重新读取数据。
+        """
+        if self.df is None and self.database is None:
+            raise ValueError("流式或聚合存储模式下数据已按原有价格区间汇总，无法重新分箱")
+        if quantiles is not None:
+            prices = (self.df['价格'] if self.df is not None
+                      else query_database(self.database, 'SELECT 价格 FROM sales')['价格'])
+            self.binning = PriceBinning.from_quantiles(prices, quantiles)
+        else:
+            self.binning = PriceBinning(PRICE_RANGES if edges is None else edges, labels)
+        return self.binning
+
     def add_price_range(self):
-        """添加价格区间列"""
-        self.df['价格区间'] = pd.cut(self.df['价格'], bins=self.price_ranges, labels=self.price_labels)
+        """添加价格区间列；分箱方案未变时直接复用已有的列"""
+        if self.df is None:
+            # 流式模式在读取时已完成分箱
+            return
+        if self._binned_key == self.binning.key:
+            return
+        self.df['价格区间'] = self.binning.assign(self.df['价格'])
+        self._binned_key = self.binning.key
+        # 价格区间变化后聚合结果和商品、切片索引需要重新计算
+        self._aggregates = None
+        self._product_index = None
+        self._slice_index = None
+
+    def get_aggregates(self):
+        """单次扫描构建(品牌 × 价格区间)聚合立方体，并派生各项分析共用的汇总表"""
+        if self.database is not None:
+            # 数据库模式：分箱方案变化时重新执行聚合查询
+            if self._binned_key != self.binning.key:
+                self._aggregates = query_aggregates(self.database, self.binning)
+                self._binned_key = self.binning.key
+            return self._aggregates
+        # 分箱方案变化或尚未分箱时先（重新）分配价格区间
+        self.add_price_range()
+        if self._aggregates is None:
+            top_products = top_products_from_index(self.get_product_index(), 5)
+            self._aggregates = summarize_cube(build_cube(self.df), top_products)
+        return self._aggregates
+
+    def get_slice_index(self):
+        """按(品牌 × 价格区间)分组的行位置索引，价格区间不变时只构建一次"""
+        if self.df is None:
+            raise ValueError("流式、聚合存储或数据库模式下没有明细数据，无法构建切片索引")
+        self.add_price_range()
+        if self._slice_index is None:
+            self._slice_index = SliceIndex(self.df)
+        return self._slice_index
+
+    def get_product_index(self):
+        """按(价格区间, 商品键)去重汇总的商品索引，价格区间不变时只构建一次"""
+        self.add_price_range()
+        if self._product_index is None:
+            self._product_index = build_product_index(self.df)
+        return self._product_index
+
+    def _brand_price_distribution(self, brand):
+        """从聚合立方体中取出单个品牌在各价位段的销售额和销量；品牌没有落在任何价位段的数据时为空表"""
+        brand_range = self.get_aggregates()['brand_range']
+        return brand_range[brand_range.index.get_level_values('品牌') == brand].droplevel('品牌')
         
     def analyze_total_sales(self):
         """分析全年销售额和销量"""
-        total_sales = self.df['销售额'].sum()
-        total_volume = self.df['销量'].sum()
+        aggregates = self.get_aggregates()
+        total_sales = aggregates['total_sales']
+        total_volume = aggregates['total_volume']
         
         print("\n=== 全年销售数据分析 ===")
         print(f"总销售额：{total_sales:,.2f} 元")
         print(f"总销量：{total_volume:,.0f} 件")
         
-        # 创建柱状图
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-        
-        ax1.bar(['销售额'], [total_sales])
-        ax1.set_title('总销售额')
-        ax1.set_ylabel('金额（元）')
-        
-        ax2.bar(['销量'], [total_volume])
-        ax2.set_title('总销量')
-        ax2.set_ylabel('数量（件）')
-        
-        plt.tight_layout()
-        plt.savefig('total_sales_analysis.png')
-        plt.close()
-        
     def analyze_price_range_distribution(self):
         """分析价位段分布"""
-        price_range_stats = self.df.groupby('价格区间').agg({
-            '销售额': 'sum',
-            '销量': 'sum'
-        })
+        price_range_stats = self.get_aggregates()['price_range']
         
         print("\n=== 价位段分布分析 ===")
         for price_range in self.price_labels:
@@ -60,57 +1322,31 @@ class LampAnalysis:
                 print(f"销售额：{sales:,.2f} 元 ({sales/price_range_stats['销售额'].sum()*100:.1f}%)")
                 print(f"销量：{volume:,.0f} 件 ({volume/price_range_stats['销量'].sum()*100:.1f}%)")
         
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-        
-        # 销售额占比饼图
-        ax1.pie(price_range_stats['销售额'], labels=price_range_stats.index,
-                autopct='%1.1f%%')
-        ax1.set_title('各价位段销售额占比')
-        
-        # 销量占比饼图
-        ax2.pie(price_range_stats['销量'], labels=price_range_stats.index,
-                autopct='%1.1f%%')
-        ax2.set_title('各价位段销量占比')
-        
-        plt.tight_layout()
-        plt.savefig('price_range_distribution.png')
-        plt.close()
-        
     def analyze_top_brands_by_price_range(self):
         """分析每个价位段TOP5品牌"""
-        result = {}
-        for price_range in self.price_labels:
-            range_data = self.df[self.df['价格区间'] == price_range]
-            top_brands = range_data.groupby('品牌').agg({
-                '销售额': 'sum',
-                '销量': 'sum'
-            }).sort_values('销售额', ascending=False).head(5)
-            
-            result[price_range] = top_brands
-            
-        return result
+        brand_range = self.get_aggregates()['brand_range'].reset_index()
+        top_brands = grouped_top_n(brand_range, '价格区间', '销售额', 5).set_index('品牌')
+        return split_by_group(top_brands, '价格区间', self.price_labels)
     
     def analyze_top_products_by_price_range(self):
-        """分析每个价位段TOP5商品"""
-        result = {}
-        for price_range in self.price_labels:
-            range_data = self.df[self.df['价格区间'] == price_range]
-            top_products = range_data.sort_values('销售额', ascending=False).head(5)[
-                ['商品标题', '商品链接', '销售额', '销量']]
-            result[price_range] = top_products
-            
-        return result
+        """分析每个价位段TOP5商品，同一商品（商品链接相同）的多行记录先合并再排名"""
+        top_products = self.get_aggregates()['top_products']
+        return split_by_group(top_products, '价格区间', self.price_labels)
     
     def analyze_brand_market_share(self):
         """分析品牌市场占比"""
-        brand_stats = self.df.groupby('品牌').agg({
-            '销售额': 'sum',
-            '销量': 'sum'
-        }).sort_values('销售额', ascending=False).head(10)
+        aggregates = self.get_aggregates()
+        brand_stats = aggregates['brand'].head(10)
         
         print("\n=== TOP10品牌市场占比分析 ===")
-        total_sales = self.df['销售额'].sum()
-        total_volume = self.df['销量'].sum()
+        total_sales = aggregates['total_sales']
+        total_volume = aggregates['total_volume']
+        
+        approximation = aggregates.get('approximation')
+        if approximation is not None:
+            bounds = approximation['品牌']
+            print(f"（近似结果：各品牌销售额最多高估 {bounds['max_error']:,.2f} 元，"
+                  f"占总销售额 {bounds['relative_error']*100:.2f}%）")
         
         for brand in brand_stats.index:
             sales = brand_stats.loc[brand, '销售额']
@@ -119,30 +1355,14 @@ class LampAnalysis:
             print(f"销售额：{sales:,.2f} 元 ({sales/total_sales*100:.1f}%)")
             print(f"销量：{volume:,.0f} 件 ({volume/total_volume*100:.1f}%)")
         
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-        
-        # 销售额占比
-        ax1.pie(brand_stats['销售额'], labels=brand_stats.index, autopct='%1.1f%%')
-        ax1.set_title('TOP10品牌销售额占比')
-        
-        # 销量占比
-        ax2.pie(brand_stats['销量'], labels=brand_stats.index, autopct='%1.1f%%')
-        ax2.set_title('TOP10品牌销量占比')
-        
-        plt.tight_layout()
-        plt.savefig('brand_market_share.png')
-        plt.close()
-        
     def analyze_top_brands_price_distribution(self):
         """分析TOP5品牌在各价位段的分布"""
-        top_5_brands = self.df.groupby('品牌')['销售额'].sum().nlargest(5).index
+        aggregates = self.get_aggregates()
+        top_5_brands = aggregates['brand'].head(5).index
         
         print("\n=== TOP5品牌价位段分布分析 ===")
         for brand in top_5_brands:
-            brand_data = self.df[self.df['品牌'] == brand].groupby('价格区间').agg({
-                '销售额': 'sum',
-                '销量': 'sum'
-            })
+            brand_data = self._brand_price_distribution(brand)
             
             total_brand_sales = brand_data['销售额'].sum()
             total_brand_volume = brand_data['销量'].sum()
@@ -159,157 +1379,608 @@ class LampAnalysis:
                     print(f"\n  {price_range}:")
                     print(f"  销售额：{sales:,.2f} 元 ({sales/total_brand_sales*100:.1f}%)")
                     print(f"  销量：{volume:,.0f} 件 ({volume/total_brand_volume*100:.1f}%)")
-            
-        brand_price_stats = pd.DataFrame()
-        for brand in top_5_brands:
-            brand_data = self.df[self.df['品牌'] == brand].groupby('价格区间').agg({
-                '销售额': 'sum',
-                '销量': 'sum'
-            })
-            brand_price_stats[brand] = brand_data['销售额']
-            
-        # 创建堆叠柱状图
-        ax = brand_price_stats.plot(kind='bar', stacked=True, figsize=(12, 6))
-        plt.title('TOP5品牌各价位段销售额分布')
-        plt.xlabel('价格区间')
-        plt.ylabel('销售额')
-        plt.legend(title='品牌')
-        plt.xticks(rotation=45)
+
+    def get_time_trend(self, freq=None):
+        """按周期重采样的销售趋势：整体（含环比）、TOP5品牌和各价位段，没有时间数据时返回None
+
+        直接由聚合立方体的周期维度计算，不再扫描明细数据；首末周期之间没有数据的周期各列为空值。
+        """
+        freq = freq or self.trend_freq
+        aggregates = self.get_aggregates()
+        cube = aggregates['cube']
+        cube = cube[cube.index.get_level_values('周期').notna()]
+        if cube.empty:
+            return None
+        
+        def resample(frame):
+            # 周期以起始日期标记，如按周时每周从周一开始；没有任何数据的周期为NaN而不是0
+            return frame.resample(freq, label='left', closed='left').sum(min_count=1)
+        
+        total = resample(cube.groupby(level='周期').sum())
+        # 空周期的前后两期都不计算环比，避免出现-100%和无穷大
+        for column in ('销售额', '销量'):
+            previous = total[column].shift()
+            total[f'{column}环比'] = ((total[column] - previous) / previous * 100).where(previous != 0)
+        empty = total['销售额'].isna() & total['销量'].isna()
+
+        def fill_observed(frame):
+            # 有数据的周期中未出现的品牌或价位段记为0，空周期保持NaN
+            frame = frame.reindex(total.index)
+            return frame.fillna(0).mask(empty, axis=0)
         
-        plt.tight_layout()
-        plt.savefig('top_brands_price_distribution.png')
-        plt.close()
-
-    def save_analysis_to_excel(self):
-        """将分析结果保存到Excel文件"""
-        # 创建一个空的DataFrame列表，用于存储所有数据
-        all_data = []
+        top_5_brands = list(aggregates['brand'].head(5).index)
+        brand_cube = cube[cube.index.get_level_values('品牌').isin(top_5_brands)]
+        brand = fill_observed(resample(brand_cube['销售额'].groupby(level=['周期', '品牌'], observed=True).sum()
+                                       .unstack('品牌').reindex(columns=top_5_brands)))
+        price_range = fill_observed(resample(cube['销售额'].groupby(level=['周期', '价格区间'], observed=True)
+                                             .sum().unstack('价格区间')))
+        return {'total': total, 'brand': brand, 'price_range': price_range}
+
+    def _period_labels(self, index):
+        """周期的显示格式：按月显示年月，按周显示起始日期"""
+        return index.strftime('%Y-%m' if self.trend_freq == TREND_FREQS['month'] else '%Y-%m-%d')
+
+    def analyze_time_trend(self):
+        """分析各周期销售额、销量及环比增长"""
+        trend = self.get_time_trend()
+        print("\n=== 销售趋势分析 ===")
+        if trend is None:
+            print("数据中没有可解析的单一周期时间（时间列缺失，或为跨多个月的区间），跳过趋势分析")
+            return None
+        
+        total = trend['total']
+        for label, (_, row) in zip(self._period_labels(total.index), total.iterrows()):
+            if pd.isna(row['销售额']) and pd.isna(row['销量']):
+                print(f"{label}：无数据")
+                continue
+            growth = '' if pd.isna(row['销售额环比']) else f"（环比 {row['销售额环比']:+.1f}%）"
+            print(f"{label}：销售额 {row['销售额']:,.2f} 元{growth}，销量 {row['销量']:,.0f} 件")
+        return trend
+
+    def chart_data(self):
+        """各图表所需的汇总数据，供渲染阶段使用；没有数据可画的图表（如无时间数据时的趋势图）不包含在内"""
+        aggregates = self.get_aggregates()
+        top_5_brands = aggregates['brand'].head(5).index
+        brand_price_stats = (aggregates['brand_range']['销售额'].unstack('品牌')
+                             .reindex(columns=top_5_brands))
+        data = {
+            'total_sales': {
+                'total_sales': aggregates['total_sales'],
+                'total_volume': aggregates['total_volume'],
+            },
+            'price_range_distribution': aggregates['price_range'],
+            'brand_market_share': aggregates['brand'].head(10),
+            'top_brands_price_distribution': brand_price_stats.dropna(how='all'),
+        }
+        # 空导出或没有价格落在任何价位段时，跳过无数据可画的图表
+        for name in ('price_range_distribution', 'brand_market_share', 'top_brands_price_distribution'):
+            if data[name].empty:
+                del data[name]
+        trend = self.get_time_trend()
+        if trend is not None:
+            total = trend['total'][['销售额', '销量']]
+            data['time_trend'] = total.set_axis(self._period_labels(total.index))
+        return data
+
+    def render_charts(self, parallel=True, fmt='png'):
+        """渲染全部图表，返回 {图表名称: 图表字节}；设置了输出目录时同时写入文件
+
+        parallel 为真时使用进程池并行渲染；fmt 为 png、svg 或 json（Vega-Lite图表描述）。
+        汇总数据未变化的图表直接取自缓存，设置了输出目录时缓存同时保存在其下的缓存目录中。
+        """
+        cache_dir = None if self.output_dir is None else self.output_dir / CACHE_DIR_NAME / 'charts'
+        self.chart_bytes = lamp_charts.render_charts(
+            self.chart_data(), self.output_dir, parallel=parallel, fmt=fmt, cache_dir=cache_dir)
+        return self.chart_bytes
+
+    def build_report_tables(self):
+        """整理报告数据，返回 {工作表名: DataFrame}，每类分析单独一张表"""
+        aggregates = self.get_aggregates()
+        total_sales = aggregates['total_sales']
+        total_volume = aggregates['total_volume']
+        range_totals = aggregates['price_range']
+        tables = {}
         
         # 总销售数据
-        total_sales = self.df['销售额'].sum()
-        total_volume = self.df['销量'].sum()
-        total_data = pd.DataFrame({
-            '分析类型': ['总体数据'] * 2,
+        tables['总体数据'] = pd.DataFrame({
             '指标': ['总销售额', '总销量'],
             '数值': [total_sales, total_volume]
         })
-        all_data.append(total_data)
         
         # 价位段分布数据
-        price_range_stats = self.df.groupby('价格区间').agg({
-            '销售额': 'sum',
-            '销量': 'sum'
-        }).reset_index()
-        price_range_stats['分析类型'] = '价位段分布'
+        price_range_stats = range_totals.reset_index()
         price_range_stats['销售额占比'] = price_range_stats['销售额'] / total_sales * 100
         price_range_stats['销量占比'] = price_range_stats['销量'] / total_volume * 100
-        all_data.append(price_range_stats)
+        tables['价位段分布'] = price_range_stats
         
-        # 各价位段TOP5品牌数据
-        for price_range in self.price_labels:
-            range_data = self.df[self.df['价格区间'] == price_range]
-            range_sales = range_data['销售额'].sum()
-            range_volume = range_data['销量'].sum()
-            
-            top_brands = range_data.groupby('品牌').agg({
-                '销售额': 'sum',
-                '销量': 'sum'
-            }).reset_index().sort_values('销售额', ascending=False).head(5)
-            
-            top_brands['分析类型'] = f'{price_range}价位TOP5品牌'
-            top_brands['价格区间'] = price_range
-            top_brands['销售额占总体比例'] = top_brands['销售额'] / total_sales * 100
-            top_brands['销量占总体比例'] = top_brands['销量'] / total_volume * 100
-            top_brands['销售额占价位段比例'] = top_brands['销售额'] / range_sales * 100
-            top_brands['销量占价位段比例'] = top_brands['销量'] / range_volume * 100
-            
-            all_data.append(top_brands)
-        
-        # 各价位段TOP5商品数据
-        for price_range in self.price_labels:
-            range_data = self.df[self.df['价格区间'] == price_range]
-            range_sales = range_data['销售额'].sum()
-            range_volume = range_data['销量'].sum()
-            
-            top_products = range_data.sort_values('销售额', ascending=False).head(5)[
-                ['商品标题', '商品链接', '销售额', '销量']]
-            top_products['分析类型'] = f'{price_range}价位TOP5商品'
-            top_products['价格区间'] = price_range
-            top_products['销售额占总体比例'] = top_products['销售额'] / total_sales * 100
-            top_products['销量占总体比例'] = top_products['销量'] / total_volume * 100
-            top_products['销售额占价位段比例'] = top_products['销售额'] / range_sales * 100
-            top_products['销量占价位段比例'] = top_products['销量'] / range_volume * 100
-            
-            all_data.append(top_products)
+        # 各价位段TOP5品牌、TOP5商品数据
+        top_brands = grouped_top_n(aggregates['brand_range'].reset_index(), '价格区间', '销售额', 5)
+        tables['价位段TOP5品牌'] = _with_range_shares(
+            top_brands, total_sales, total_volume, range_totals)
+        tables['价位段TOP5商品'] = _with_range_shares(
+            aggregates['top_products'], total_sales, total_volume, range_totals)
         
         # TOP10品牌市场占比
-        brand_stats = self.df.groupby('品牌').agg({
-            '销售额': 'sum',
-            '销量': 'sum'
-        }).reset_index().sort_values('销售额', ascending=False).head(10)
-        
-        brand_stats['分析类型'] = 'TOP10品牌市场占比'
+        brand_stats = aggregates['brand'].head(10).reset_index()
         brand_stats['销售额占比'] = brand_stats['销售额'] / total_sales * 100
         brand_stats['销量占比'] = brand_stats['销量'] / total_volume * 100
-        all_data.append(brand_stats)
+        tables['TOP10品牌市场占比'] = brand_stats
         
-        # TOP5品牌价位段分布
-        top_5_brands = self.df.groupby('品牌')['销售额'].sum().nlargest(5).index
-        for brand in top_5_brands:
-            brand_data = self.df[self.df['品牌'] == brand].groupby('价格区间').agg({
-                '销售额': 'sum',
-                '销量': 'sum'
-            }).reset_index()
-            
-            brand_total_sales = brand_data['销售额'].sum()
-            brand_total_volume = brand_data['销量'].sum()
-            
-            brand_data['分析类型'] = f'{brand}品牌价位段分布'
-            brand_data['品牌'] = brand
-            brand_data['销售额占品牌总额比例'] = brand_data['销售额'] / brand_total_sales * 100
-            brand_data['销量占品牌总量比例'] = brand_data['销量'] / brand_total_volume * 100
-            brand_data['销售额占总体比例'] = brand_data['销售额'] / total_sales * 100
-            brand_data['销量占总体比例'] = brand_data['销量'] / total_volume * 100
-            
-            all_data.append(brand_data)
+        # TOP5品牌价位段分布，按品牌排名、价格区间排列
+        top_5_brands = list(aggregates['brand'].head(5).index)
+        brand_data = aggregates['brand_range'].reset_index()
+        brand_data = brand_data[brand_data['品牌'].isin(top_5_brands)]
+        brand_data['品牌'] = pd.Categorical(brand_data['品牌'].astype(object), categories=top_5_brands)
+        brand_data = brand_data.sort_values(['品牌', '价格区间']).reset_index(drop=True)
+        brand_totals = brand_data.groupby('品牌', observed=True)[['销售额', '销量']].transform('sum')
+        brand_data['销售额占品牌总额比例'] = brand_data['销售额'] / brand_totals['销售额'] * 100
+        brand_data['销量占品牌总量比例'] = brand_data['销量'] / brand_totals['销量'] * 100
+        brand_data['销售额占总体比例'] = brand_data['销售额'] / total_sales * 100
+        brand_data['销量占总体比例'] = brand_data['销量'] / total_volume * 100
+        tables['TOP5品牌价位段分布'] = brand_data
         
-        # 合并所有数据并保存到Excel
-        final_data = pd.concat(all_data, ignore_index=True)
-        with pd.ExcelWriter('台灯销售分析报告.xlsx') as writer:
-            final_data.to_excel(writer, sheet_name='销售分析报告', index=False)
-
-# 在main函数中添加调用
-def main():
-    # 获取target目录下的Excel文件
-    target_dir = Path('target')
-    excel_files = list(target_dir.glob('*.xlsx'))
-    
+        # 近似模式下各草图的误差范围
+        approximation = aggregates.get('approximation')
+        if approximation is not None:
+            tables['近似误差'] = pd.DataFrame([
+                {'统计对象': name, '草图容量': bounds['capacity'], '跟踪数量': bounds['tracked'],
+                 '总销售额': bounds['total'], '最大高估销售额': bounds['max_error'],
+                 '最大高估比例': bounds['relative_error'] * 100}
+                for name, bounds in approximation.items()
+            ])
+        
+        # 时间趋势：整体、TOP5品牌和各价位段按周期的销售额
+        trend = self.get_time_trend()
+        if trend is not None:
+            for sheet_name, key in (('时间趋势', 'total'), ('品牌时间趋势', 'brand'),
+                                    ('价位段时间趋势', 'price_range')):
+                frame = trend[key]
+                frame = frame.set_axis(self._period_labels(frame.index)).rename_axis('周期')
+                frame.columns = [str(column) for column in frame.columns]
+                tables[sheet_name] = frame.reset_index()
+        
+        return tables
+
+    def save_analysis_to_excel(self, tables=None):
+        """生成Excel分析报告并返回文件字节；设置了输出目录时同时写入文件
+
+        tables 为已整理好的报告数据，省略时调用 build_report_tables 生成；所用数据保存在 report_tables 中。
+        """
+        if tables is None:
+            tables = self.build_report_tables()
+        self.report_tables = tables
+        self.report_bytes = write_excel_report(tables)
+        if self.output_dir is not None:
+            self._output_path(REPORT_FILE_NAME).write_bytes(self.report_bytes)
+        return self.report_bytes
+
+
+class AnalysisCancelled(Exception):
+    """分析流程在阶段之间被取消"""
+
+
+def run_pipeline(file_path, output_dir='.', streaming=False, charts=True, parallel_charts=True,
+                 progress=None, cancel_event=None, use_cache=True, profiler=None, chart_format='png'):
+    """按阶段运行完整分析流程并返回分析器
+
+    output_dir 为None时不写任何文件，结果通过分析器的 report_bytes、report_tables 和 chart_bytes 取得。
+    chart_format 为图表格式：png、svg 或 json。
+
+    每个阶段开始和结束时调用 progress(阶段, 状态, 耗时秒数)，状态为 'start'、'done' 或 'skipped'。
+    cancel_event（threading.Event）被置位后，在下一阶段开始前抛出 AnalysisCancelled。
+    传入 profiler（StageProfiler）时记录各阶段及每项分析的耗时、峰值内存和行数。
+    """
+    def run_stage(name, func, rows=None):
+        if cancel_event is not None and cancel_event.is_set():
+            raise AnalysisCancelled(f"分析已在“{name}”阶段前取消")
+        if progress is not None:
+            progress(name, 'start', 0.0)
+        start = time.perf_counter()
+        with profiled(profiler, name, rows) as record:
+            result = func()
+            if record is not None and rows is None:
+                record['rows'] = getattr(result, 'rows', None)
+        if progress is not None:
+            progress(name, 'done', time.perf_counter() - start)
+        return result
+
+    def aggregate():
+        for step in (analyzer.add_price_range, analyzer.analyze_total_sales,
+                     analyzer.analyze_price_range_distribution, analyzer.analyze_brand_market_share,
+                     analyzer.analyze_top_brands_price_distribution, analyzer.analyze_time_trend):
+            with profiled(profiler, step.__name__, analyzer.rows):
+                step()
+
+    load_stage, aggregate_stage, chart_stage, export_stage = PIPELINE_STAGES
+    analyzer = run_stage(load_stage, lambda: LampAnalysis(
+        file_path, use_cache=use_cache, streaming=streaming, output_dir=output_dir))
+    run_stage(aggregate_stage, aggregate, analyzer.rows)
+    if charts:
+        run_stage(chart_stage, lambda: analyzer.render_charts(parallel_charts, chart_format),
+                  analyzer.rows)
+    elif progress is not None:
+        progress(chart_stage, 'skipped', 0.0)
+    run_stage(export_stage, analyzer.save_analysis_to_excel, analyzer.rows)
+    return analyzer
+
+
+def analyze_file(file_path, output_dir, streaming=False, charts=True, profile=False,
+                 profile_memory=False):
+    """分析单个工作簿并将报告、图表和控制台输出写入 output_dir，返回数据行数"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    profiler = StageProfiler(trace_memory=profile_memory) if profile else None
+    with open(output_dir / '分析日志.txt', 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log):
+        # 批量模式下文件级已经并行，图表在本进程内串行渲染
+        analyzer = run_pipeline(file_path, output_dir, streaming=streaming, charts=charts,
+                                parallel_charts=False, profiler=profiler)
+    if profiler is not None:
+        profiler.write_json(output_dir / PROFILE_FILE_NAME)
+    return analyzer.rows
+
+
+def run_batch(directory, output_root='output', workers=None, streaming=False, charts=True,
+              profile=False, profile_memory=False):
+    """用进程池并行分析目录下的全部工作簿，每个文件的结果写入 output_root 下的同名子目录"""
+    excel_files = find_excel_files(directory)
     if not excel_files:
         print("未找到Excel文件！")
+        return []
+
+    output_root = Path(output_root)
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(analyze_file, path, output_root / path.stem, streaming, charts,
+                            profile, profile_memory): path
+            for path in excel_files
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"[失败] {path.name}：{e}")
+                continue
+            results.append((path, rows))
+            print(f"[完成] {path.name}：{rows:,} 行 -> {output_root / path.stem}")
+    elapsed = time.perf_counter() - start
+
+    total_rows = sum(rows for _, rows in results)
+    print("\n=== 批量分析汇总 ===")
+    print(f"成功 {len(results)} / {len(excel_files)} 个文件，共 {total_rows:,} 行，耗时 {elapsed:.2f} 秒")
+    if elapsed > 0:
+        print(f"吞吐量：{len(results) / elapsed:.2f} 文件/秒，{total_rows / elapsed:,.0f} 行/秒")
+    return results
+
+
+def _file_brand_range(file_path, edges, labels, use_cache=True):
+    """对比模式的工作进程：读取一个文件，返回(品牌 × 价格区间)汇总、行数、总销售额和总销量
+
+    总计包含品牌或价格区间缺失的行，与单文件报告的总体数据一致。
+    """
+    analyzer = LampAnalysis(file_path, use_cache=use_cache, output_dir=None)
+    analyzer.binning = PriceBinning(edges, labels)
+    aggregates = analyzer.get_aggregates()
+    return (aggregates['brand_range'].reset_index(), analyzer.rows,
+            aggregates['total_sales'], aggregates['total_volume'])
+
+
+def compare_files(file_paths, workers=None, edges=PRICE_RANGES, labels=PRICE_LABELS,
+                  use_cache=True):
+    """并行读取多个文件，对比各文件的品牌份额和价位段结构，返回 {表名: DataFrame}
+
+    各文件的品牌通过同一份品牌字典编码为整数，汇总为 (文件 × 品牌 × 价格区间) 数组后按数组运算对比；
+    变化量均相对第一个文件，单位为百分点。
+    """
+    file_paths = [Path(path) for path in file_paths]
+    if not file_paths:
+        raise ValueError("没有需要对比的文件")
+    binning = PriceBinning(edges, labels)
+    with ProcessPoolExecutor(max_workers=workers or min(len(file_paths), os.cpu_count() or 1)) as executor:
+        results = list(executor.map(_file_brand_range, file_paths, [binning.edges] * len(file_paths),
+                                     [binning.labels] * len(file_paths), [use_cache] * len(file_paths)))
+    frames = [frame for frame, *_ in results]
+
+    # 共享品牌字典：所有文件的品牌合并为同一组分类，各文件按同一编码对齐
+    brands = pd.api.types.union_categoricals(
+        [pd.Categorical(frame['品牌'].astype(object)) for frame in frames], ignore_order=True).categories
+    n_brands, n_ranges = len(brands), len(binning.labels)
+    sales = np.zeros((len(frames), n_brands, n_ranges))
+    for i, frame in enumerate(frames):
+        # 分类编号可能是int8/int16，组合成单元格编号前先转为int64以免溢出
+        brand_codes = pd.Categorical(frame['品牌'].astype(object), categories=brands).codes.astype(np.int64)
+        range_codes = frame['价格区间'].astype(binning.dtype).cat.codes.to_numpy(dtype=np.int64)
+        # 只在品牌和价位段拆分中去掉缺少品牌或价格区间的行，文件总计取自全部行
+        valid = (brand_codes >= 0) & (range_codes >= 0)
+        cells = brand_codes[valid] * n_ranges + range_codes[valid]
+        sales[i] = np.bincount(cells, weights=frame['销售额'].to_numpy(dtype=float)[valid],
+                               minlength=n_brands * n_ranges).reshape(n_brands, n_ranges)
+
+    names = [path.stem for path in file_paths]
+
+    def share(values):
+        # values 为 (文件 × 项目)，返回各文件内的占比（%）
+        totals = values.sum(axis=1, keepdims=True)
+        return np.divide(values, totals, out=np.zeros_like(values), where=totals != 0) * 100
+
+    def comparison(index, values, index_name):
+        shares = share(values)
+        deltas = shares - shares[:1]
+        table = pd.DataFrame(index=pd.Index(index, name=index_name))
+        for i, name in enumerate(names):
+            table[f'{name} 销售额'] = values[i]
+            table[f'{name} 占比'] = shares[i]
+            if i > 0:
+                table[f'{name} 占比变化'] = deltas[i]
+        return table
+
+    brand_sales = sales.sum(axis=2)
+    order = np.argsort(-brand_sales.sum(axis=0), kind='stable')
+    brand_table = comparison(brands[order], brand_sales[:, order], '品牌')
+    range_table = comparison(binning.labels, sales.sum(axis=1), '价格区间')
+    summary = pd.DataFrame({
+        '文件': names,
+        '行数': [rows for _, rows, _, _ in results],
+        '品牌数': (brand_sales > 0).sum(axis=1),
+        '总销售额': [total_sales for _, _, total_sales, _ in results],
+        '总销量': [total_volume for _, _, _, total_volume in results],
+    })
+    return {
+        '文件汇总': summary,
+        '品牌份额对比': brand_table.reset_index(),
+        '价位段结构对比': range_table.reset_index(),
+    }
+
+
+def print_comparison(tables, top=10):
+    """打印各文件概况、份额变化最大的品牌和价位段结构变化"""
+    summary = tables['文件汇总']
+    print("\n=== 文件概况 ===")
+    for _, row in summary.iterrows():
+        print(f"{row['文件']}：{row['行数']:,} 行，{row['品牌数']:,} 个品牌，"
+              f"销售额 {row['总销售额']:,.2f} 元，销量 {row['总销量']:,.0f} 件")
+    if len(summary) < 2:
         return
-        
-    analyzer = LampAnalysis(excel_files[0])
-    analyzer.add_price_range()
-    
-    # 执行各项分析
-    analyzer.analyze_total_sales()
-    analyzer.analyze_price_range_distribution()
+    baseline = summary['文件'].iloc[0]
+    for table_name, key in (('品牌份额对比', '品牌'), ('价位段结构对比', '价格区间')):
+        table = tables[table_name]
+        print(f"\n=== {table_name}（相对 {baseline}，百分点）===")
+        for name in summary['文件'].iloc[1:]:
+            delta = table.set_index(key)[f'{name} 占比变化']
+            if key == '品牌':
+                delta = delta.reindex(delta.abs().sort_values(ascending=False).index[:top])
+            print(f"\n{name}：")
+            for label, value in delta.items():
+                print(f"  {label}：{value:+.2f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="台灯销售数据分析")
+    parser.add_argument('--input', metavar='FILE',
+                        help="分析指定的工作簿或CSV文件，默认取 target 目录下第一个工作簿")
+    parser.add_argument('--batch', metavar='DIR', help="批量分析目录下的全部工作簿")
+    parser.add_argument('--compare', metavar='FILE', nargs='+',
+                        help="并行读取多个工作簿（或一个目录下的全部工作簿），对比品牌份额和价位段结构")
+    parser.add_argument('--output-dir', default=None,
+                        help="输出目录（批量模式默认 output，单文件默认当前目录）")
+    parser.add_argument('--workers', type=int, default=None, help="批量模式的进程数，默认CPU核数")
+    parser.add_argument('--streaming', action='store_true', help="流式读取，不在内存中保留明细数据")
+    parser.add_argument('--approximate', type=int, metavar='K',
+                        help="近似模式：流式读取，品牌和各价位段商品排行用容量为K的Space-Saving草图估计，"
+                             "报告中给出误差范围")
+    parser.add_argument('--no-charts', action='store_true', help="不生成图表，只输出报告")
+    parser.add_argument('--chart-format', choices=lamp_charts.CHART_FORMATS, default='png',
+                        help="图表格式：png、svg，或由浏览器渲染的Vega-Lite图表描述 json")
+    parser.add_argument('--output', choices=OUTPUT_FORMATS,
+                        help="以结构化格式输出各项分析结果：json 写到标准输出，"
+                             "parquet/csv 每张表一个文件写到输出目录；此时不导出Excel报告")
+    parser.add_argument('--print', action='store_true',
+                        help="--output 模式下仍打印分析结果（写到标准错误）")
+    parser.add_argument('--charts', action='store_true', help="--output 模式下仍生成图表")
+    parser.add_argument('--trend-freq', choices=sorted(TREND_FREQS), default='month',
+                        help="趋势分析的周期粒度")
+    parser.add_argument('--bins', type=parse_bin_edges,
+                        help="自定义价格区间边界，逗号分隔，如 0,50,100,200,inf")
+    parser.add_argument('--quantile-bins', type=int, metavar='N', help="按价格分位数划分N个区间")
+    parser.add_argument('--store', metavar='PATH', help="增量聚合存储文件，基于其中的聚合结果生成报告")
+    parser.add_argument('--append', metavar='FILE', nargs='+', default=[],
+                        help="先将这些工作簿合并进 --store 指定的存储")
+    parser.add_argument('--database', metavar='PATH',
+                        help="本地SQLite数据库，各项分析以聚合查询在数据库中完成")
+    parser.add_argument('--ingest', metavar='FILE', nargs='*',
+                        help="先将这些文件导入 --database 指定的数据库，不指定文件时导入 target 目录下的全部工作簿")
+    parser.add_argument('--profile', nargs='?', const=PROFILE_FILE_NAME, metavar='PATH',
+                        help=f"记录各阶段耗时、峰值内存和行数并写入JSON（相对输出目录，默认 {PROFILE_FILE_NAME}）")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="--profile 时同时用 tracemalloc 统计峰值内存（会使耗时成倍增加，耗时不宜与未开启时比较）")
+    args = parser.parse_args(argv)
+    check_bin_args(parser, args)
+    return args
+
+
+def parse_bin_edges(text):
+    """解析 --bins 参数：逗号分隔且严格递增的价格区间边界"""
+    try:
+        return PriceBinning([float(edge) for edge in text.split(',')]).edges
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"无效的价格区间边界 {text!r}：{e}")
+
+
+def check_bin_args(parser, args):
+    """分箱参数与读取模式冲突时直接报错退出：流式、近似和聚合存储模式在读取时已完成分箱"""
+    if args.bins and args.quantile_bins:
+        parser.error("--bins 和 --quantile-bins 只能指定一个")
+    if args.quantile_bins and (args.streaming or args.approximate is not None or args.store):
+        parser.error("--quantile-bins 需要全部价格数据，不能与 --streaming、--approximate 或 --store 同时使用")
+    if args.bins and args.store:
+        store = load_store(args.store)
+        if store is not None and store['state'] is not None \
+                and store['state']['price_ranges'] != args.bins:
+            parser.error(f"聚合存储 {args.store} 已按价格区间 {store['state']['price_ranges']} 汇总，"
+                         "不能改用其他 --bins")
+
+
+def print_analyses(analyzer, profiler=None):
+    """在控制台打印各项分析结果"""
+    with profiled(profiler, 'analyze_total_sales', analyzer.rows):
+        analyzer.analyze_total_sales()
+    with profiled(profiler, 'analyze_price_range_distribution', analyzer.rows):
+        analyzer.analyze_price_range_distribution()
     
     # 输出TOP5品牌分析结果
-    top_brands = analyzer.analyze_top_brands_by_price_range()
-    for price_range, brands in top_brands.items():
-        print(f"\n{price_range}价位段TOP5品牌：")
-        print(brands)
+    with profiled(profiler, 'analyze_top_brands_by_price_range', analyzer.rows):
+        top_brands = analyzer.analyze_top_brands_by_price_range()
+        for price_range, brands in top_brands.items():
+            print(f"\n{price_range}价位段TOP5品牌：")
+            print(brands)
     
     # 输出TOP5商品分析结果
-    top_products = analyzer.analyze_top_products_by_price_range()
-    for price_range, products in top_products.items():
-        print(f"\n{price_range}价位段TOP5商品：")
-        print(products)
+    with profiled(profiler, 'analyze_top_products_by_price_range', analyzer.rows):
+        top_products = analyzer.analyze_top_products_by_price_range()
+        for price_range, products in top_products.items():
+            print(f"\n{price_range}价位段TOP5商品：")
+            print(products)
+    
+    with profiled(profiler, 'analyze_brand_market_share', analyzer.rows):
+        analyzer.analyze_brand_market_share()
+    with profiled(profiler, 'analyze_top_brands_price_distribution', analyzer.rows):
+        analyzer.analyze_top_brands_price_distribution()
+    with profiled(profiler, 'analyze_time_trend', analyzer.rows):
+        analyzer.analyze_time_trend()
+
+
+def run_cli(args, profiler=None):
+    """按命令行参数加载数据并完成分析，返回分析器和整理好的结果表；没有输入数据时返回None
+
+    未指定 --output 时打印分析结果并导出Excel报告；指定时只整理结果表，
+    控制台打印和图表渲染需分别通过 --print、--charts 开启。
+    """
+    headless = args.output is not None
+    output_dir = args.output_dir or '.'
+    load_stage, _, chart_stage, export_stage = PIPELINE_STAGES
+    if args.store:
+        with profiled(profiler, load_stage) as record:
+            for file_path in args.append:
+                update_store(args.store, file_path, price_bins=args.bins)
+            analyzer = LampAnalysis.from_store(args.store, output_dir=output_dir)
+    elif args.database:
+        with profiled(profiler, load_stage) as record:
+            if args.ingest is not None:
+                for file_path in args.ingest or find_excel_files('target'):
+                    ingest_database(args.database, file_path, price_bins=args.bins)
+            analyzer = LampAnalysis.from_database(args.database, output_dir=output_dir,
+                                                  price_bins=args.bins)
+    else:
+        # 未指定输入文件时获取target目录下的Excel文件
+        excel_files = [args.input] if args.input else find_excel_files('target')
+        
+        if not excel_files:
+            print("未找到Excel文件！")
+            return None
+            
+        with profiled(profiler, load_stage) as record:
+            analyzer = LampAnalysis(excel_files[0], streaming=args.streaming, output_dir=output_dir,
+                                    approximate=args.approximate, price_bins=args.bins)
+    if record is not None:
+        record['rows'] = analyzer.rows
+    analyzer.trend_freq = TREND_FREQS[args.trend_freq]
+    with profiled(profiler, 'add_price_range', analyzer.rows):
+        # 自定义边界已在构建分析器时指定，分位数需在读取数据后计算
+        if args.quantile_bins:
+            analyzer.set_price_bins(quantiles=args.quantile_bins)
+        analyzer.add_price_range()
+    
+    # 执行各项分析
+    if not headless or args.print:
+        analyzer.print_memory_report()
+        print_analyses(analyzer, profiler)
+    if args.charts if headless else not args.no_charts:
+        with profiled(profiler, chart_stage, analyzer.rows):
+            analyzer.render_charts(fmt=args.chart_format)
+    if headless:
+        with profiled(profiler, 'build_report_tables', analyzer.rows):
+            tables = analyzer.build_report_tables()
+    else:
+        with profiled(profiler, export_stage, analyzer.rows):
+            tables = analyzer.build_report_tables()
+            analyzer.save_analysis_to_excel(tables)
+    return analyzer, tables
+
+
+def run_compare(args):
+    """对比模式：结果写为对比报告，或按 --output 输出结构化数据"""
+    file_paths = args.compare
+    if len(file_paths) == 1 and Path(file_paths[0]).is_dir():
+        file_paths = find_excel_files(file_paths[0])
+    if not file_paths:
+        print("未找到Excel文件！")
+        return None
+    edges = args.bins or PRICE_RANGES
+    labels = None if args.bins else PRICE_LABELS
+    output_dir = Path(args.output_dir or '.')
+    if args.output is None:
+        tables = compare_files(file_paths, args.workers, edges, labels)
+        print_comparison(tables)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        (output_dir / COMPARE_REPORT_FILE_NAME).write_bytes(write_excel_report(tables))
+        print(f"\n对比报告已保存到 {output_dir / COMPARE_REPORT_FILE_NAME}")
+        return tables
+
+    with contextlib.redirect_stdout(sys.stderr):
+        tables = compare_files(file_paths, args.workers, edges, labels)
+        if args.print:
+            print_comparison(tables)
+        content = format_tables(tables, args.output, output_dir)
+    print(content)
+    return tables
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.batch:
+        run_batch(args.batch, args.output_dir or 'output', args.workers, args.streaming,
+                  charts=not args.no_charts, profile=args.profile is not None,
+                  profile_memory=args.profile_memory)
+        return
+
+    if args.compare:
+        run_compare(args)
+        return
+
+    if args.append and not args.store:
+        print("--append 需要同时指定 --store")
+        return
+    if args.ingest is not None and not args.database:
+        print("--ingest 需要同时指定 --database")
+        return
     
-    analyzer.analyze_brand_market_share()
-    analyzer.analyze_top_brands_price_distribution()
-    analyzer.save_analysis_to_excel()  # 添加这一行
+    profiler = StageProfiler(trace_memory=args.profile_memory) if args.profile else None
+    output_dir = Path(args.output_dir or '.')
+    if args.output is None:
+        result = run_cli(args, profiler)
+    else:
+        # 结构化输出模式下标准输出只保留机器可读结果，提示信息改写到标准错误
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_cli(args, profiler)
+            if result is not None:
+                analyzer, tables = result
+                with profiled(profiler, PIPELINE_STAGES[-1], analyzer.rows):
+                    content = format_tables(tables, args.output, output_dir)
+        if result is not None:
+            print(content)
+    if result is None:
+        return
+
+    if profiler is not None:
+        log = sys.stdout if args.output is None else sys.stderr
+        with contextlib.redirect_stdout(log):
+            profiler.print_summary()
+            profile_path = output_dir / args.profile
+            profiler.write_json(profile_path)
+            print(f"分析画像已保存到 {profile_path}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,326 @@
+"""图表渲染：根据预先计算好的汇总数据生成图表，可在进程池中并行执行，按汇总数据内容缓存"""
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from atomic_io import atomic_write_bytes
+
+# 支持的图表格式：png、svg 由matplotlib渲染，json 为浏览器端渲染的Vega-Lite图表描述
+CHART_FORMATS = ('png', 'svg', 'json')
+
+# 渲染版本，修改图表样式后递增，使已缓存的图表失效
+RENDER_VERSION = 1
+
+# 进程内图表缓存的条目上限
+MEMORY_CACHE_SIZE = 64
+_memory_cache = OrderedDict()
+# 网页应用等多线程场景下会并发读写进程内缓存
+_memory_cache_lock = threading.Lock()
+
+# 图表名称与输出文件名
+CHART_FILES = {
+    'total_sales': 'total_sales_analysis.png',
+    'price_range_distribution': 'price_range_distribution.png',
+    'brand_market_share': 'brand_market_share.png',
+    'top_brands_price_distribution': 'top_brands_price_distribution.png',
+    'time_trend': 'sales_trend.png',
+}
+
+
+def _pyplot():
+    """加载使用非交互式Agg后端的pyplot并设置中文字体"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    # 设置中文字体
+    plt.rcParams['font.sans-serif'] = ['Arial Unicode MS']
+    plt.rcParams['axes.unicode_minus'] = False
+    return plt
+
+
+def render_total_sales(data, output, fmt='png'):
+    """总销售额和总销量柱状图，data 为 {'total_sales': ..., 'total_volume': ...}"""
+    plt = _pyplot()
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+
+    ax1.bar(['销售额'], [data['total_sales']])
+    ax1.set_title('总销售额')
+    ax1.set_ylabel('金额（元）')
+
+    ax2.bar(['销量'], [data['total_volume']])
+    ax2.set_title('总销量')
+    ax2.set_ylabel('数量（件）')
+
+    fig.tight_layout()
+    fig.savefig(output, format=fmt)
+    plt.close(fig)
+
+
+def render_price_range_distribution(data, output, fmt='png'):
+    """各价位段销售额、销量占比饼图，data 为按价格区间索引的汇总表"""
+    plt = _pyplot()
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+
+    # 销售额占比饼图
+    ax1.pie(data['销售额'], labels=data.index, autopct='%1.1f%%')
+    ax1.set_title('各价位段销售额占比')
+
+    # 销量占比饼图
+    ax2.pie(data['销量'], labels=data.index, autopct='%1.1f%%')
+    ax2.set_title('各价位段销量占比')
+
+    fig.tight_layout()
+    fig.savefig(output, format=fmt)
+    plt.close(fig)
+
+
+def render_brand_market_share(data, output, fmt='png'):
+    """TOP10品牌销售额、销量占比饼图，data 为按品牌索引的汇总表"""
+    plt = _pyplot()
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+
+    # 销售额占比
+    ax1.pie(data['销售额'], labels=data.index, autopct='%1.1f%%')
+    ax1.set_title('TOP10品牌销售额占比')
+
+    # 销量占比
+    ax2.pie(data['销量'], labels=data.index, autopct='%1.1f%%')
+    ax2.set_title('TOP10品牌销量占比')
+
+    fig.tight_layout()
+    fig.savefig(output, format=fmt)
+    plt.close(fig)
+
+
+def render_top_brands_price_distribution(data, output, fmt='png'):
+    """TOP5品牌各价位段销售额堆叠柱状图，data 的行为价格区间、列为品牌"""
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(12, 6))
+
+    data.plot(kind='bar', stacked=True, ax=ax)
+    ax.set_title('TOP5品牌各价位段销售额分布')
+    ax.set_xlabel('价格区间')
+    ax.set_ylabel('销售额')
+    ax.legend(title='品牌')
+    ax.tick_params(axis='x', labelrotation=45)
+
+    fig.tight_layout()
+    fig.savefig(output, format=fmt)
+    plt.close(fig)
+
+
+def render_time_trend(data, output, fmt='png'):
+    """各周期销售额、销量折线图，data 为按周期标签索引的汇总表"""
+    plt = _pyplot()
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+    positions = range(len(data))
+
+    ax1.plot(positions, data['销售额'], marker='o')
+    ax1.set_title('各周期销售额')
+    ax1.set_ylabel('金额（元）')
+
+    ax2.plot(positions, data['销量'], marker='o', color='tab:orange')
+    ax2.set_title('各周期销量')
+    ax2.set_ylabel('数量（件）')
+
+    for ax in (ax1, ax2):
+        ax.set_xticks(list(positions))
+        ax.set_xticklabels(data.index, rotation=45)
+
+    fig.tight_layout()
+    fig.savefig(output, format=fmt)
+    plt.close(fig)
+
+
+RENDERERS = {
+    'total_sales': render_total_sales,
+    'price_range_distribution': render_price_range_distribution,
+    'brand_market_share': render_brand_market_share,
+    'top_brands_price_distribution': render_top_brands_price_distribution,
+    'time_trend': render_time_trend,
+}
+
+
+def _records(frame):
+    """DataFrame 转为行记录列表，numpy类型转为Python类型，缺失值为None"""
+    return json.loads(frame.to_json(orient='records', force_ascii=False))
+
+
+def _pie_pair(data, titles):
+    """左右两张饼图：销售额占比和销量占比"""
+    values = _records(data.rename_axis('名称').reset_index().astype({'名称': str}))
+    return {
+        'data': {'values': values},
+        'hconcat': [
+            {'title': title, 'mark': {'type': 'arc', 'tooltip': True},
+             'encoding': {'theta': {'field': field, 'type': 'quantitative'},
+                          'color': {'field': '名称', 'type': 'nominal', 'sort': None}}}
+            for title, field in zip(titles, ('销售额', '销量'))
+        ],
+    }
+
+
+def spec_total_sales(data):
+    """总销售额和总销量柱状图的图表描述"""
+    values = [{'指标': '销售额', '数值': float(data['total_sales'])},
+              {'指标': '销量', '数值': float(data['total_volume'])}]
+    return {
+        'hconcat': [
+            {'title': title, 'data': {'values': [value]}, 'mark': 'bar',
+             'encoding': {'x': {'field': '指标', 'type': 'nominal'},
+                          'y': {'field': '数值', 'type': 'quantitative', 'title': unit}}}
+            for title, unit, value in zip(('总销售额', '总销量'), ('金额（元）', '数量（件）'), values)
+        ],
+    }
+
+
+def spec_price_range_distribution(data):
+    """各价位段销售额、销量占比饼图的图表描述"""
+    return _pie_pair(data, ('各价位段销售额占比', '各价位段销量占比'))
+
+
+def spec_brand_market_share(data):
+    """TOP10品牌销售额、销量占比饼图的图表描述"""
+    return _pie_pair(data, ('TOP10品牌销售额占比', 'TOP10品牌销量占比'))
+
+
+def spec_top_brands_price_distribution(data):
+    """TOP5品牌各价位段销售额堆叠柱状图的图表描述"""
+    long = data.rename_axis(index='价格区间', columns='品牌').stack().rename('销售额').reset_index()
+    long = long.astype({'价格区间': str, '品牌': str})
+    return {
+        'title': 'TOP5品牌各价位段销售额分布',
+        'data': {'values': _records(long)},
+        'mark': {'type': 'bar', 'tooltip': True},
+        'encoding': {
+            'x': {'field': '价格区间', 'type': 'ordinal', 'sort': [str(label) for label in data.index]},
+            'y': {'field': '销售额', 'type': 'quantitative', 'stack': 'zero'},
+            'color': {'field': '品牌', 'type': 'nominal', 'sort': [str(brand) for brand in data.columns]},
+        },
+    }
+
+
+def spec_time_trend(data):
+    """各周期销售额、销量折线图的图表描述"""
+    values = _records(data.rename_axis('周期').reset_index().astype({'周期': str}))
+    return {
+        'data': {'values': values},
+        'hconcat': [
+            {'title': title, 'mark': {'type': 'line', 'point': True, 'tooltip': True},
+             'encoding': {'x': {'field': '周期', 'type': 'ordinal'},
+                          'y': {'field': field, 'type': 'quantitative', 'title': unit}}}
+            for title, field, unit in (('各周期销售额', '销售额', '金额（元）'),
+                                       ('各周期销量', '销量', '数量（件）'))
+        ],
+    }
+
+
+SPECS = {
+    'total_sales': spec_total_sales,
+    'price_range_distribution': spec_price_range_distribution,
+    'brand_market_share': spec_brand_market_share,
+    'top_brands_price_distribution': spec_top_brands_price_distribution,
+    'time_trend': spec_time_trend,
+}
+
+
+def chart_key(name, data, fmt='png'):
+    """图表缓存键：图表名称、格式、渲染版本和汇总数据内容的SHA-256"""
+    if hasattr(data, 'to_json'):
+        content = data.to_json(orient='split', double_precision=15, force_ascii=False)
+    else:
+        content = json.dumps(data, sort_keys=True, default=float)
+    digest = hashlib.sha256(f'{RENDER_VERSION}|{name}|{fmt}|'.encode())
+    digest.update(content.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _cache_get(key, cache_dir):
+    with _memory_cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+    if cache_dir is not None:
+        path = Path(cache_dir) / key
+        if path.exists():
+            content = path.read_bytes()
+            _cache_put(key, content, None)
+            return content
+    return None
+
+
+def _cache_put(key, content, cache_dir):
+    with _memory_cache_lock:
+        _memory_cache[key] = content
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    if cache_dir is not None:
+        try:
+            cache_dir = Path(cache_dir)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(cache_dir / key, content)
+        except OSError as e:
+            print(f"写入图表缓存失败，已跳过：{e}")
+
+
+def chart_file_name(name, fmt='png'):
+    """图表输出文件名，扩展名随格式变化"""
+    return str(Path(CHART_FILES[name]).with_suffix(f'.{fmt}'))
+
+
+def render_chart(name, data, path=None, fmt='png'):
+    """在内存中渲染单张图表并返回字节，指定 path 时同时写入文件
+
+    fmt 为 png、svg 时用matplotlib渲染；json 时生成由浏览器端渲染的Vega-Lite图表描述，不加载matplotlib。
+    """
+    if fmt == 'json':
+        content = json.dumps(SPECS[name](data), ensure_ascii=False).encode('utf-8')
+    else:
+        buffer = io.BytesIO()
+        RENDERERS[name](data, buffer, fmt)
+        content = buffer.getvalue()
+    if path is not None:
+        Path(path).write_bytes(content)
+    return content
+
+
+def render_charts(chart_data, output_dir=None, parallel=True, workers=None, fmt='png',
+                  cache_dir=None):
+    """渲染 {图表名称: 汇总数据} 中的全部图表，返回 {图表名称: 图表字节}
+
+    output_dir 不为None时同时写入对应文件；parallel 为真时每张图表在独立进程中渲染。
+    图表按 chart_key 缓存在进程内存中，指定 cache_dir 时同时缓存到磁盘，汇总数据不变时直接复用。
+    """
+    if fmt not in CHART_FORMATS:
+        raise ValueError(f"不支持的图表格式：{fmt}")
+    results, jobs = {}, []
+    for name, data in chart_data.items():
+        key = chart_key(name, data, fmt)
+        path = None if output_dir is None else Path(output_dir) / chart_file_name(name, fmt)
+        content = _cache_get(key, cache_dir)
+        if content is None:
+            jobs.append((key, name, data, path))
+            continue
+        if path is not None:
+            path.write_bytes(content)
+        results[name] = content
+
+    # json 图表描述生成很快，不值得启动进程池
+    if not parallel or len(jobs) <= 1 or fmt == 'json':
+        rendered = {key: render_chart(name, data, path, fmt) for key, name, data, path in jobs}
+    else:
+        with ProcessPoolExecutor(max_workers=workers or len(jobs)) as executor:
+            futures = {key: executor.submit(render_chart, name, data, path, fmt)
+                       for key, name, data, path in jobs}
+            rendered = {key: future.result() for key, future in futures.items()}
+    for key, name, _, _ in jobs:
+        _cache_put(key, rendered[key], cache_dir)
+        results[name] = rendered[key]
+    # 保持与 chart_data 相同的顺序
+    return {name: results[name] for name in chart_data}
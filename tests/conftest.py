@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# 测试直接导入仓库根目录下的模块和 benchmarks 中的合成数据生成器
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from synthetic import generate_frame  # noqa: E402
+
+
+@pytest.fixture
+def write_export(tmp_path):
+    """返回写导出文件的函数：write_export(rows, name) 将行列表或DataFrame写为 tmp_path 下的CSV并返回路径"""
+    def write(rows, name='export.csv'):
+        path = tmp_path / name
+        pd.DataFrame(rows).to_csv(path, index=False)
+        return path
+    return write
+
+
+@pytest.fixture
+def sales_frame():
+    """两千行、六个月的合成销售数据，含缺失链接、缺失品牌和不在任何价位段内的价格"""
+    frame = generate_frame(2000, n_brands=30, n_products=300, months=6, seed=0)
+    frame['品牌'] = frame['品牌'].astype(object)
+    frame.loc[::97, '商品链接'] = None
+    frame.loc[::89, '品牌'] = None
+    frame.loc[::83, '价格'] = -1.0
+    return frame
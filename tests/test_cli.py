@@ -0,0 +1,29 @@
+import pytest
+
+from lamp_analysis import parse_args, update_store
+
+
+@pytest.mark.parametrize('argv', [
+    ['--streaming', '--quantile-bins', '3'],
+    ['--approximate', '10', '--quantile-bins', '3'],
+    ['--store', 'missing.pkl', '--quantile-bins', '3'],
+    ['--bins', '0,100,inf', '--quantile-bins', '3'],
+    ['--bins', '0,abc'],
+    ['--bins', '100,0'],
+])
+def test_parse_args_rejects_bin_conflicts(argv):
+    """读取时已分箱的模式不能再按分位数分箱，无效边界在解析参数时报错"""
+    with pytest.raises(SystemExit):
+        parse_args(argv)
+
+
+def test_parse_args_rejects_bins_differing_from_store(tmp_path, write_export):
+    store = tmp_path / 'store.pkl'
+    export = write_export([
+        {'商品标题': '台灯A', '商品链接': 'https://item.example/a', '销售额': 100.0, '销量': 2, '品牌': '品牌A', '价格': 50},
+        {'商品标题': '台灯B', '商品链接': 'https://item.example/b', '销售额': 900.0, '销量': 3, '品牌': '品牌B', '价格': 300},
+    ])
+    update_store(store, export, price_bins=[0, 100, float('inf')])
+    assert parse_args(['--store', str(store), '--bins', '0,100,inf']).bins == [0.0, 100.0, float('inf')]
+    with pytest.raises(SystemExit):
+        parse_args(['--store', str(store), '--bins', '0,200,inf'])
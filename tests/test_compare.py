@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lamp_analysis import compare_files
+
+
+def _brand_rows(n_brands, seed):
+    """有 n_brands 个品牌、每个品牌在每个价位段都有销售的导出数据"""
+    rng = np.random.default_rng(seed)
+    prices = [50, 150, 250, 350, 450, 600, 900, 1500]
+    rows = [
+        {'商品标题': f'台灯{brand}-{price}', '商品链接': f'https://item.example/{brand}-{price}',
+         '销售额': float(rng.integers(1, 1000)), '销量': int(rng.integers(1, 50)),
+         '品牌': f'品牌{brand:03d}', '价格': float(price)}
+        for brand in range(n_brands) for price in prices
+    ]
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize('n_brands', [100, 5000])
+def test_compare_files_many_brands(write_export, n_brands):
+    """品牌数超过int8/int16分类编号范围时，单元格编号不能溢出，各品牌销售额需与原始数据一致"""
+    first = _brand_rows(n_brands, seed=1)
+    second = _brand_rows(n_brands, seed=2)
+
+    tables = compare_files([write_export(first, 'part1.csv'), write_export(second, 'part2.csv')], workers=1)
+
+    brands = tables['品牌份额对比'].set_index('品牌')
+    for name, frame in (('part1', first), ('part2', second)):
+        expected = frame.groupby('品牌')['销售额'].sum()
+        assert np.allclose(brands[f'{name} 销售额'].reindex(expected.index), expected)
+    summary = tables['文件汇总'].set_index('文件')
+    assert summary.loc['part1', '品牌数'] == n_brands
+    assert summary.loc['part2', '总销售额'] == pytest.approx(second['销售额'].sum())
+
+
+def test_compare_files_totals_include_unassigned_rows(write_export):
+    """缺少品牌或价格不在任何价位段的行不计入拆分，但计入文件总销售额和总销量"""
+    path = write_export({
+        '商品标题': ['台灯A', '台灯B', '台灯C'],
+        '商品链接': ['https://item.example/a', 'https://item.example/b', 'https://item.example/c'],
+        '销售额': [100.0, 200.0, 300.0],
+        '销量': [1, 2, 3],
+        '品牌': ['品牌A', None, '品牌A'],
+        '价格': [50.0, 150.0, None],
+    }, 'part.csv')
+
+    tables = compare_files([path], workers=1)
+
+    summary = tables['文件汇总'].set_index('文件')
+    assert summary.loc['part', '总销售额'] == pytest.approx(600.0)
+    assert summary.loc['part', '总销量'] == pytest.approx(6)
+    assert tables['品牌份额对比']['part 销售额'].sum() == pytest.approx(100.0)
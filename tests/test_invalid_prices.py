@@ -0,0 +1,25 @@
+import pytest
+
+from lamp_analysis import LampAnalysis
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_all_invalid_prices(write_export, streaming):
+    """没有任何价格落在价位段内时，各项结果为空表而不是报错"""
+    path = write_export({
+        '时间': ['2024-03', '2024-04', '2024-04'],
+        '商品标题': ['台灯A', '台灯B', '台灯C'],
+        '商品链接': ['https://item.example/a', 'https://item.example/b', None],
+        '销售额': [100.0, 200.0, 300.0],
+        '销量': [1, 2, 3],
+        '品牌': ['品牌A', '品牌B', '品牌A'],
+        '价格': [None, -5.0, 0.0],
+    })
+
+    analyzer = LampAnalysis(path, output_dir=None, streaming=streaming)
+    tables = analyzer.build_report_tables()
+    for name in ('价位段分布', '价位段TOP5品牌', '价位段TOP5商品', 'TOP5品牌价位段分布'):
+        assert tables[name].empty
+    assert all(products.empty for products in analyzer.analyze_top_products_by_price_range().values())
+    analyzer.analyze_top_brands_price_distribution()
+    assert 'price_range_distribution' not in analyzer.chart_data()
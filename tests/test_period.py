@@ -0,0 +1,21 @@
+import pandas as pd
+
+from lamp_analysis import parse_period
+
+
+def test_parse_period_single_periods():
+    """单个月份、日期和一个月内的区间取周期起点"""
+    values = pd.Series(['2024-03', '2024/3/5', '2024-03-28 ~ 2024-04-03', '2024-03-01 至 2024-03-31'])
+    expected = pd.to_datetime(['2024-03-01', '2024-03-05', '2024-03-28', '2024-03-01'])
+    assert parse_period(values).tolist() == list(expected)
+
+
+def test_parse_period_multi_month_range_is_nat():
+    """跨多个月的区间不属于单一周期，不能被当作起始月份"""
+    values = pd.Series(['2024-03 至 2025-02', '2024-03 至 2024-04', '2024-03', '无', None])
+    parsed = parse_period(values)
+    assert parsed.isna().tolist() == [True, True, False, True, True]
+
+
+def test_parse_period_all_missing():
+    assert parse_period(pd.Series([None, None], dtype=object)).isna().all()
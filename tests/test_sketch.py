@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from lamp_analysis import SpaceSavingSketch, product_keys
+
+
+@pytest.mark.parametrize('capacity', [50, 100])
+def test_space_saving_bounds(sales_frame, capacity):
+    """估计值不低于真实值，高估量不超过各自的误差和 max_error，max_error 不超过总量/容量，
+    真实值超过 max_error 的键一定被跟踪"""
+    frame = sales_frame.assign(商品键=product_keys(sales_frame))
+    sketch = SpaceSavingSketch(capacity, '商品键', '销售额', sums=['销量'], firsts=['商品标题'])
+    for start in range(0, len(frame), 150):
+        sketch.update(frame.iloc[start:start + 150])
+
+    truth = frame.groupby('商品键')['销售额'].sum()
+    estimates = sketch.estimates()
+    bounds = sketch.bounds()
+    assert bounds['tracked'] == capacity
+    assert bounds['total'] == pytest.approx(frame['销售额'].sum())
+    assert bounds['max_error'] <= bounds['total'] / capacity
+
+    true_values = truth.reindex(estimates.index).to_numpy()
+    overestimate = estimates['销售额'].to_numpy() - true_values
+    assert (overestimate >= -1e-6).all()
+    assert (overestimate <= estimates['误差'].to_numpy() + 1e-6).all()
+    assert (estimates['误差'] <= bounds['max_error'] + 1e-6).all()
+
+    heavy = truth[truth > bounds['max_error']].index
+    assert np.isin(heavy, estimates.index).all()
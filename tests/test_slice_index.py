@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from lamp_analysis import LampAnalysis, build_product_index, top_products_from_index
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'brands': ['品牌0000', '品牌0003', '不存在的品牌']},
+    {'price_ranges': ['100-200', '1000+']},
+    {'brands': ['品牌0001', '品牌0002'], 'price_ranges': ['200-300'], 'start': '2024-04', 'end': '2024-07'},
+    {'start': '2024-05'},
+])
+def test_slice_summary_matches_boolean_mask(write_export, sales_frame, filters):
+    """切片索引的汇总与对明细表做布尔筛选后重新汇总的结果一致"""
+    analyzer = LampAnalysis(write_export(sales_frame), use_cache=False, output_dir=None)
+    summary = analyzer.get_slice_index().summary(**filters)
+
+    df = analyzer.df
+    mask = pd.Series(True, index=df.index)
+    if 'brands' in filters:
+        mask &= df['品牌'].isin(filters['brands'])
+    if 'price_ranges' in filters:
+        mask &= df['价格区间'].isin(filters['price_ranges'])
+    if 'start' in filters:
+        mask &= df['周期'] >= pd.Timestamp(filters['start'])
+    if 'end' in filters:
+        mask &= df['周期'] < pd.Timestamp(filters['end'])
+    selected = df[mask]
+
+    assert summary['rows'] == len(selected)
+    assert summary['total_sales'] == pytest.approx(selected['销售额'].sum())
+    assert summary['total_volume'] == pytest.approx(selected['销量'].sum())
+    for key, column in (('brand', '品牌'), ('price_range', '价格区间')):
+        expected = selected.groupby(column, observed=True)[['销售额', '销量']].sum()
+        expected = expected[(expected['销售额'] != 0) | (expected['销量'] != 0)]
+        # 切片汇总以普通字符串为索引，按字符串排序后比较
+        actual = summary[key].set_axis(summary[key].index.astype(str)).sort_index()
+        expected = expected.set_axis(expected.index.astype(str)).sort_index()
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    # 商品排行中各价位段按出现顺序排列，切片内行的顺序与原表不同，按价位段排序后比较
+    def by_range(products):
+        return products.sort_values(['价格区间', '销售额'], ascending=[True, False]).reset_index(drop=True)
+
+    expected_products = top_products_from_index(build_product_index(selected), 5)
+    pd.testing.assert_frame_equal(by_range(summary['top_products']), by_range(expected_products),
+                                  check_dtype=False)
@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+from lamp_analysis import LampAnalysis, update_store
+
+
+@pytest.mark.parametrize('first_save', ['update_store', 'in_memory', 'streaming'])
+def test_store_over_two_periods_matches_full_recompute(tmp_path, write_export, sales_frame, first_save):
+    """先保存前几个月、再合并后几个月的存储，与一次读入全部数据的报告表一致"""
+    months = sales_frame['时间'].astype(str)
+    first = write_export(sales_frame[months < '2024-06'], 'first.csv')
+    second = write_export(sales_frame[months >= '2024-06'], 'second.csv')
+    store = tmp_path / 'store.pkl'
+
+    if first_save == 'update_store':
+        update_store(store, first, chunksize=300)
+    else:
+        LampAnalysis(first, use_cache=False, output_dir=None, streaming=first_save == 'streaming',
+                     chunksize=300).save_store(store)
+    update_store(store, second, chunksize=300)
+
+    expected = LampAnalysis(write_export(sales_frame, 'full.csv'), use_cache=False,
+                            output_dir=None).build_report_tables()
+    tables = LampAnalysis.from_store(store, output_dir=None).build_report_tables()
+    for name, table in expected.items():
+        pd.testing.assert_frame_equal(tables[name], table, check_dtype=False, check_categorical=False,
+                                      obj=name)
@@ -0,0 +1,17 @@
+import pandas as pd
+import pytest
+
+from lamp_analysis import LampAnalysis
+
+
+@pytest.mark.parametrize('chunksize', [250, 5000])
+def test_streaming_report_tables_match_in_memory(write_export, sales_frame, chunksize):
+    """流式读取的各张报告表与整表读入内存的结果一致；内存模式会压缩列类型，只比较取值"""
+    path = write_export(sales_frame)
+    expected = LampAnalysis(path, use_cache=False, output_dir=None).build_report_tables()
+    tables = LampAnalysis(path, output_dir=None, streaming=True, chunksize=chunksize).build_report_tables()
+
+    assert list(tables) == list(expected)
+    for name, table in expected.items():
+        pd.testing.assert_frame_equal(tables[name], table, check_dtype=False, check_categorical=False,
+                                      obj=name)
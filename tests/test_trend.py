@@ -0,0 +1,22 @@
+import numpy as np
+
+from lamp_analysis import LampAnalysis
+
+
+def test_time_trend_gap_periods_are_empty(write_export, sales_frame):
+    """没有数据的月份为空值而不是0，其前后都不计算环比"""
+    months = sales_frame['时间'].astype(str)
+    path = write_export(sales_frame[~months.isin(['2024-05', '2024-06'])])
+
+    trend = LampAnalysis(path, use_cache=False, output_dir=None).get_time_trend()
+
+    total = trend['total']
+    labels = list(total.index.strftime('%Y-%m'))
+    gap = [labels.index('2024-05'), labels.index('2024-06')]
+    assert total.iloc[gap][['销售额', '销量', '销售额环比', '销量环比']].isna().all().all()
+    after = labels.index('2024-07')
+    assert np.isnan(total['销售额环比'].iloc[after])
+    assert np.isfinite(total['销售额环比'].drop(total.index[gap + [after, 0]])).all()
+    for key in ('brand', 'price_range'):
+        assert trend[key].iloc[gap].isna().all().all()
+        assert trend[key].drop(total.index[gap]).notna().all().all()
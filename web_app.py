@@ -1,7 +1,100 @@
-import streamlit as st
+import hashlib
+import io
+import json
+
 import pandas as pd
-from lamp_analysis import LampAnalysis
-import os
+import streamlit as st
+
+import lamp_charts
+from lamp_analysis import LampAnalysis, REPORT_FILE_NAME, write_excel_report
+
+# 图表名称与页面上显示的标题
+CHART_CAPTIONS = {
+    'total_sales': "总销售分析",
+    'price_range_distribution': "价位段分布",
+    'brand_market_share': "品牌市场占比",
+    'top_brands_price_distribution': "TOP5品牌价位段分布",
+    'time_trend': "销售趋势",
+}
+
+
+@st.cache_resource(max_entries=4, ttl=3600, show_spinner=False)
+def load_analyzer(content_hash, _content):
+    """按上传文件内容哈希缓存已加载的分析器及其聚合结果和切片索引，筛选时直接查询，不再重新读取文件
+
+    分析器在多个会话间共享：价格区间列、聚合结果、商品索引和切片索引都在放入缓存前构建完成，
+    之后各会话线程只读取，不会并发填充这些惰性缓存；缓存条目数和存活时间有上限。
+    """
+    analyzer = LampAnalysis(io.BytesIO(_content), output_dir=None)
+    analyzer.get_aggregates()
+    analyzer.get_slice_index()
+    return analyzer
+
+
+# 页面上可选的图表格式：交互式图表只传输Vega-Lite图表描述，由浏览器渲染
+CHART_FORMATS = {"交互式": 'json', "SVG": 'svg', "PNG": 'png'}
+
+
+@st.cache_data(max_entries=8, ttl=3600, show_spinner=False)
+def analyze_upload(content_hash, _content, chart_format='json'):
+    """按上传文件内容哈希和图表格式缓存分析结果，报告和图表以字节形式保存
+
+    _content 以下划线开头，不参与缓存键计算；缓存条目数和存活时间有上限，超出后按最近最少使用淘汰。
+    分析全程在内存中完成，不写任何文件，多个会话并发时互不影响；
+    图表在当前线程中依次生成，避免每次上传都在服务进程内再启动一个进程池。
+    """
+    analyzer = load_analyzer(content_hash, _content)
+    return {
+        'report': write_excel_report(analyzer.build_report_tables()),
+        'charts': lamp_charts.render_charts(analyzer.chart_data(), parallel=False, fmt=chart_format),
+    }
+
+
+def show_chart(content, chart_format, caption):
+    """按格式显示图表：json 为Vega-Lite图表描述，svg、png 为图片"""
+    if chart_format == 'json':
+        st.markdown(f"**{caption}**")
+        st.vega_lite_chart(json.loads(content), use_container_width=True)
+    elif chart_format == 'svg':
+        st.image(content.decode('utf-8'), caption=caption)
+    else:
+        st.image(content, caption=caption)
+
+
+def show_drill_down(analyzer):
+    """按品牌、价格区间和时间范围筛选，显示切片的合计、分布和TOP5商品"""
+    st.subheader("数据筛选")
+    index = analyzer.get_slice_index()
+    overall = analyzer.get_aggregates()['brand']
+    
+    col1, col2 = st.columns(2)
+    brands = col1.multiselect("品牌（不选为全部）", list(overall.index))
+    price_ranges = col2.multiselect("价格区间（不选为全部）", list(index.labels))
+    
+    filters = {'brands': brands or None, 'price_ranges': price_ranges or None}
+    periods = pd.Series(index.periods).dropna().unique()
+    if len(periods) > 1:
+        periods = sorted(pd.to_datetime(periods))
+        start, end = st.select_slider("时间范围", options=periods, value=(periods[0], periods[-1]),
+                                      format_func=lambda period: period.strftime('%Y-%m'))
+        if (start, end) != (periods[0], periods[-1]):
+            # 结束周期包含在内，查询范围左闭右开
+            filters.update(start=start, end=end + pd.Timedelta(days=1))
+    
+    summary = index.summary(**filters)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("销售额（元）", f"{summary['total_sales']:,.2f}")
+    col2.metric("销量（件）", f"{summary['total_volume']:,.0f}")
+    col3.metric("数据行数", f"{summary['rows']:,}")
+    
+    col1, col2 = st.columns(2)
+    col1.markdown("**品牌分布（TOP10）**")
+    col1.dataframe(summary['brand'].head(10))
+    col2.markdown("**价位段分布**")
+    col2.dataframe(summary['price_range'])
+    st.markdown("**各价位段TOP5商品**")
+    st.dataframe(summary['top_products'], hide_index=True)
+
 
 def main():
     st.set_page_config(page_title="台灯销售数据分析工具", layout="wide")
@@ -28,6 +121,8 @@ def main():
             * 价位段分布
             * 品牌市场占比
             * TOP5品牌价位段分布
+            * 销售趋势（按月汇总及环比）
+        - 按品牌、价格区间和时间范围筛选，查看所选数据的合计、分布和TOP5商品
     
     4. **注意事项**：
         - 分析过程中请勿刷新页面
@@ -38,51 +133,40 @@ def main():
     
     # 文件上传
     uploaded_file = st.file_uploader("选择Excel文件", type=['xlsx'])
+    chart_format = CHART_FORMATS[st.radio("图表格式", list(CHART_FORMATS), horizontal=True)]
     
     if uploaded_file is not None:
-        try:
-            # 保存上传的文件
-            with open("temp.xlsx", "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            
-            if st.button("开始分析"):
+        content = uploaded_file.getvalue()
+        content_hash = hashlib.sha256(content).hexdigest()
+        
+        if st.button("开始分析"):
+            # 记录已分析的文件，之后页面重新运行时直接从缓存取结果
+            st.session_state['analyzed_hash'] = content_hash
+        
+        if st.session_state.get('analyzed_hash') == content_hash:
+            try:
                 with st.spinner("正在分析数据..."):
-                    # 运行分析
-                    analyzer = LampAnalysis("temp.xlsx")
-                    analyzer.add_price_range()
-                    analyzer.analyze_total_sales()
-                    analyzer.analyze_price_range_distribution()
-                    analyzer.analyze_brand_market_share()
-                    analyzer.analyze_top_brands_price_distribution()
-                    analyzer.save_analysis_to_excel()
-                    
-                    # 提供下载链接
-                    with open("台灯销售分析报告.xlsx", "rb") as file:
-                        st.download_button(
-                            label="下载分析报告",
-                            data=file,
-                            file_name="台灯销售分析报告.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-                    
-                    # 显示生成的图片
-                    if os.path.exists("total_sales_analysis.png"):
-                        st.image("total_sales_analysis.png", caption="总销售分析")
-                    if os.path.exists("price_range_distribution.png"):
-                        st.image("price_range_distribution.png", caption="价位段分布")
-                    if os.path.exists("brand_market_share.png"):
-                        st.image("brand_market_share.png", caption="品牌市场占比")
-                    if os.path.exists("top_brands_price_distribution.png"):
-                        st.image("top_brands_price_distribution.png", caption="TOP5品牌价位段分布")
-                    
-                    st.success("分析完成！")
-                    
-        except Exception as e:
-            st.error(f"分析过程中出现错误：{str(e)}")
-        finally:
-            # 清理临时文件
-            if os.path.exists("temp.xlsx"):
-                os.remove("temp.xlsx")
+                    result = analyze_upload(content_hash, content, chart_format)
+                
+                # 提供下载链接
+                st.download_button(
+                    label="下载分析报告",
+                    data=result['report'],
+                    file_name=REPORT_FILE_NAME,
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+                
+                # 显示生成的图表
+                for name, caption in CHART_CAPTIONS.items():
+                    if name in result['charts']:
+                        show_chart(result['charts'][name], chart_format, caption)
+                
+                st.success("分析完成！")
+                
+                show_drill_down(load_analyzer(content_hash, content))
+                
+            except Exception as e:
+                st.error(f"分析过程中出现错误：{str(e)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file